@@ -0,0 +1,97 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import metrics
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"overloaded ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    # Bounded concurrency for LLM-bound work with a bounded wait queue.
+    # Callers that cannot get a slot before their deadline are shed up front
+    # (using a moving average of slot hold time) instead of timing out later.
+    def __init__(self, max_concurrency: int, max_queue: int, est_service_seconds: float = 5.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._avg_service = est_service_seconds
+
+    def _retry_after(self) -> int:
+        backlog = (self._waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(backlog * self._avg_service))
+
+    def _shed(self, reason: str):
+        metrics.inc("agroqa_shed_total", reason=reason)
+        raise Overloaded(reason, self._retry_after())
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"active": self._active, "waiting": self._waiting,
+                    "max_concurrency": self.max_concurrency, "max_queue": self.max_queue}
+
+    @contextmanager
+    def slot(self, deadline: float | None = None):
+        # deadline is an absolute time.monotonic() value
+        t_wait = time.monotonic()
+        with self._cond:
+            if self._active >= self.max_concurrency or self._waiting:
+                if self._waiting >= self.max_queue:
+                    self._shed("queue_full")
+                expected = (self._waiting + 1) / self.max_concurrency * self._avg_service
+                if deadline is not None and t_wait + expected > deadline:
+                    self._shed("deadline")
+                self._waiting += 1
+                try:
+                    while self._active >= self.max_concurrency:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self._shed("deadline")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+        t0 = time.monotonic()
+        metrics.observe("agroqa_stage_seconds", t0 - t_wait, stage="llm_queue")
+        try:
+            yield
+        finally:
+            held = time.monotonic() - t0
+            with self._cond:
+                self._active -= 1
+                self._avg_service = 0.8 * self._avg_service + 0.2 * held
+                self._cond.notify()
+
+class RateLimiter:
+    # Per-client token buckets; least recently seen clients are evicted past max_clients.
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def allow(self, client: str) -> tuple[bool, int]:
+        # returns (allowed, retry_after_seconds)
+        if self.rate <= 0:
+            return True, 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            ok = tokens >= 1.0
+            if ok:
+                tokens -= 1.0
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if ok:
+            return True, 0
+        metrics.inc("agroqa_shed_total", reason="rate_limit")
+        return False, max(1, math.ceil((1.0 - tokens) / self.rate))
@@ -1,14 +1,28 @@
 import os
 import re
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, request, jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
 from retriever import Retriever
 from models import answer
 from dotenv import load_dotenv
+import metrics
+from coalesce import SingleFlight, CoalesceTimeout, chat_key
+from admission import AdmissionController, RateLimiter, Overloaded
 import io, base64, ast
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import numpy as np
+
+_plot_mods = None
+
+def _plotting():
+    # matplotlib/numpy are only needed when the model returns chart code
+    global _plot_mods
+    if _plot_mods is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        import numpy as np
+        _plot_mods = (plt, np)
+    return _plot_mods
 
 def _safe_exec_matplotlib(code: str) -> str:
     tree = ast.parse(code, mode="exec")
@@ -20,6 +34,7 @@ def _safe_exec_matplotlib(code: str) -> str:
         if isinstance(node, ast.Attribute):
             if isinstance(node.attr, str) and node.attr.startswith("__"):
                 raise ValueError("Disallowed attribute access.")
+    plt, np = _plotting()
     safe_globals = {
         "__builtins__": {"range": range, "len": len, "min": min, "max": max, "sum": sum, "abs": abs},
         "plt": plt, "np": np,
@@ -36,8 +51,49 @@ def _safe_exec_matplotlib(code: str) -> str:
 
 load_dotenv()
 
+WARMUP_QUERY = os.getenv("WARMUP_QUERY", "irrigation scheduling for corn")
+# identical concurrent /chat requests share one retrieval + completion
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "1") != "0"
+COALESCE_WAIT_SECONDS = float(os.getenv("COALESCE_WAIT_SECONDS", "90"))
+# admission control for the OpenAI-bound part of /chat. Limits are per worker
+# process: the global LLM concurrency is WEB_CONCURRENCY x LLM_MAX_CONCURRENCY,
+# and gunicorn.conf.py sizes its thread pool from these values
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_DEADLINE_SECONDS = float(os.getenv("LLM_QUEUE_DEADLINE_SECONDS", "20"))
+DEGRADE_ON_OVERLOAD = os.getenv("DEGRADE_ON_OVERLOAD", "1") != "0"
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))  # per client, 0 disables
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "10"))
+# number of reverse proxies in front of the app whose X-Forwarded-For can be trusted
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+SNIPPET_CHARS = 300
+
 app = Flask(__name__, static_folder="ui", static_url_path="/ui")
-retr = Retriever()
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+retr = None
+_state = {"ready": False, "draining": False}
+_inflight = SingleFlight()
+_llm_gate = AdmissionController(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE)
+_rate_limiter = RateLimiter(RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+
+def get_retriever() -> Retriever:
+    global retr
+    if retr is None:
+        retr = Retriever()
+    return retr
+
+def warmup(embedding_function=None):
+    # open the index and push one query through the embedding model so the
+    # first real request does not pay for lazy initialisation
+    global retr
+    if retr is None:
+        retr = Retriever(embedding_function=embedding_function)
+    retr.search(WARMUP_QUERY, k=1)
+    _state["ready"] = True
+
+def mark_draining():
+    _state["draining"] = True
 
 @app.get("/")
 def root():
@@ -47,8 +103,90 @@ def root():
 def health():
     return jsonify({"ok": True})
 
+@app.get("/ready")
+def ready():
+    if _state["ready"] and not _state["draining"]:
+        return jsonify({"ready": True, "index_version": retr.version if retr else None})
+    return jsonify({"ready": False, "draining": _state["draining"]}), 503
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # queue state is sampled at scrape time rather than on every slot change
+    for state, value in _llm_gate.stats().items():
+        metrics.set_gauge("agroqa_llm_slots", value, state=state)
+    metrics.set_gauge("agroqa_chat_inflight", _inflight.in_flight())
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.after_request
+def _count_response(resp):
+    metrics.inc("agroqa_http_requests_total", endpoint=request.endpoint or "unknown", status=resp.status_code)
+    return resp
+
+def _citations(docs):
+    return [
+        {"idx": i + 1, "source": d["meta"].get("source"), "page": d["meta"].get("page"), "score": d.get("score")}
+        for i, d in enumerate(docs)
+    ]
+
+def _retrieval_only(docs) -> dict:
+    # degraded answer used when the LLM queue is saturated: citations plus snippets, no completion
+    lines = ["The assistant is under heavy load, so here are the most relevant excerpts instead of a written answer:"]
+    for i, d in enumerate(docs):
+        snippet = re.sub(r"\s+", " ", d["text"]).strip()
+        if len(snippet) > SNIPPET_CHARS:
+            snippet = snippet[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+        lines.append(f"[{i + 1}] {snippet}")
+    return {"answer": "\n\n".join(lines), "graph_image": None, "citations": _citations(docs), "degraded": True}
+
+def build_response(q: str, mode: str = "short", k: int = 5, filters: dict | None = None,
+                   deadline: float | None = None) -> dict:
+    with metrics.timed("retrieve"):
+        docs = get_retriever().search(q, k=k, filters=filters)
+    metrics.observe("agroqa_retrieved_chunks", len(docs), buckets=metrics.COUNT_BUCKETS)
+
+    try:
+        with _llm_gate.slot(deadline):
+            out, graph = answer(q, docs, mode=mode)
+    except Overloaded:
+        if not DEGRADE_ON_OVERLOAD:
+            raise
+        metrics.inc("agroqa_degraded_total")
+        return _retrieval_only(docs)
+
+    with metrics.timed("postprocess"):
+        out = re.sub(r"```[\s\S]*?```", "", out).strip()
+        lines = []
+        for line in out.splitlines():
+            if re.search(r"(?i)\b(matplotlib|seaborn|plotly|plt\.)", line):
+                continue
+            if re.search(r"(?i)\b(chart|graph|plot|figure)\b", line):
+                continue
+            lines.append(line)
+        out = "\n".join(lines).strip()
+
+    if graph and graph.strip().upper() != "N/A":
+        try:
+            with metrics.timed("render_graph"):
+                graph = _safe_exec_matplotlib(graph)
+        except Exception as e:
+            graph = None
+
+    return {"answer": out, "graph_image": graph, "citations": _citations(docs)}
+
+def _client_id() -> str:
+    # remote_addr only reflects X-Forwarded-For when TRUSTED_PROXY_HOPS enables ProxyFix
+    return request.remote_addr or "unknown"
+
+def _too_many(msg: str, retry_after: int):
+    resp = jsonify({"error": msg, "retry_after": retry_after})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp
+
 @app.post("/chat")
 def chat():
+    t0 = time.perf_counter()
+    timings = metrics.begin_request()
     data = request.get_json(force=True, silent=True) or {}
     q = data.get("q", "").strip()
     if not q:
@@ -60,31 +198,37 @@ def chat():
         filters = None
     k = data.get("k", 5)
 
-    docs = retr.search(q, k=k, filters=filters)
-    out, graph = answer(q, docs, mode=mode)
-    
-    out = re.sub(r"```[\s\S]*?```", "", out).strip()
-    lines = []
-    for line in out.splitlines():
-        if re.search(r"(?i)\b(matplotlib|seaborn|plotly|plt\.)", line):
-            continue
-        if re.search(r"(?i)\b(chart|graph|plot|figure)\b", line):
-            continue
-        lines.append(line)
-    out = "\n".join(lines).strip()
+    allowed, retry_after = _rate_limiter.allow(_client_id())
+    if not allowed:
+        return _too_many("Rate limit exceeded", retry_after)
 
-    if graph and graph.strip().upper() != "N/A":
-        try:
-            graph = _safe_exec_matplotlib(graph)
-        except Exception as e:
-            graph = None
-    
-    citations = [
-        {"idx": i + 1, "source": d["meta"].get("source"), "page": d["meta"].get("page"), "score": d.get("score")}
-        for i, d in enumerate(docs)
-    ]
-    return jsonify({"answer": out, "graph_image": graph, "citations": citations})
+    deadline = time.monotonic() + LLM_QUEUE_DEADLINE_SECONDS
+    compute = lambda: build_response(q, mode=mode, k=k, filters=filters, deadline=deadline)
+    try:
+        if COALESCE_ENABLED:
+            result, shared = _inflight.do(chat_key(q, mode, k, filters), compute, timeout=COALESCE_WAIT_SECONDS)
+            metrics.record_cache("chat_inflight", shared)
+        else:
+            result, shared = compute(), False
+    except CoalesceTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except Overloaded as e:
+        return _too_many("Server busy", e.retry_after)
+
+    elapsed = time.perf_counter() - t0
+    metrics.observe("agroqa_request_seconds", elapsed)
+    # the result may be shared with other requests, so never mutate it in place
+    body = dict(result)
+    # opt-in per request: {"timings": true} in the payload
+    if data.get("timings") and timings is not None:
+        timings["total_ms"] = round(elapsed * 1000, 2)
+        timings["coalesced"] = shared
+        body["timings"] = timings
+    return jsonify(body)
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "8000"))
+    # with debug=True the reloader re-runs this file in a child; only that process serves
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warmup()
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
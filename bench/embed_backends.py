@@ -0,0 +1,136 @@
+import os, sys, json, math, time, argparse, resource, statistics, subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = Path(__file__).resolve().parent.parent
+for p in (ROOT, ROOT / "eval"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from runner import percentile
+
+OUT_JSON = ROOT / "bench" / "embed_report.json"
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+K = 5
+
+def _rss_mb():
+    # peak RSS so far; ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def child(backend, threads, concurrency, rounds):
+    # runs in a fresh interpreter so import cost and memory are measured in isolation
+    os.chdir(ROOT)
+    from score_retrieval import GOLD, load_gold, relevance, metrics_at
+    import embeddings
+    from retriever import Retriever
+
+    items = load_gold(GOLD)
+    queries = [it["q"] for it in items]
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    single = embeddings.make_embedding_function(backend=backend, threads=threads, batching=False)
+    single(["warmup"])
+    load_s = time.perf_counter() - t0
+    # read before the Retriever/index and the concurrency run raise the peak further
+    rss_loaded = _rss_mb()
+
+    lat = []
+    for _ in range(rounds):
+        for q in queries:
+            t = time.perf_counter()
+            single([q])
+            lat.append((time.perf_counter() - t) * 1000)
+
+    docs = (queries * 64)[:256]
+    t = time.perf_counter()
+    for b in range(0, len(docs), 32):
+        single(docs[b : b + 32])
+    batch_tput = len(docs) / (time.perf_counter() - t)
+
+    # concurrent single-query encodes through the dynamic batcher, as under /chat load
+    batched = embeddings.BatchingEmbedder(single.backend)
+    work = queries * rounds
+    t = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(lambda q: batched([q]), work))
+    conc_qps = len(work) / (time.perf_counter() - t)
+
+    vecs = single(queries)
+    retr = Retriever(embedding_function=single)
+    hits = retr.search_many(queries, k=K, embeddings=vecs)
+    recall = mrr = 0.0
+    for it, h in zip(items, hits):
+        m = metrics_at(relevance(h, it["expect_sources"], it["expect_pages"]), K)
+        recall += m["recall"]
+        mrr += m["mrr"]
+    n = len(items) or 1
+
+    return {
+        "backend": backend,
+        "threads": threads,
+        "load_s": load_s,
+        "peak_rss_loaded_mb": rss_loaded,
+        "model_load_rss_mb": rss_loaded - rss0,
+        "peak_rss_mb": _rss_mb(),
+        "query_ms_p50": statistics.median(lat),
+        "query_ms_p95": percentile(lat, 95),
+        "batch_docs_per_s": batch_tput,
+        "concurrent_qps": conc_qps,
+        f"recall@{K}": recall / n,
+        f"mrr@{K}": mrr / n,
+        "vectors": [[float(x) for x in v] for v in vecs],
+    }
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare embedding backends: latency, throughput, memory and recall.")
+    ap.add_argument("--backends", nargs="+", default=BACKENDS)
+    ap.add_argument("--threads", type=int, default=int(os.getenv("EMB_THREADS", "0")))
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.threads, args.concurrency, args.rounds)))
+        return
+
+    results = []
+    for backend in args.backends:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--threads", str(args.threads),
+             "--concurrency", str(args.concurrency), "--rounds", str(args.rounds)],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            err = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+            print(f"{backend}: skipped ({err})")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    # agreement of query vectors with the current torch path
+    vectors = {r["backend"]: r.pop("vectors") for r in results}
+    ref = vectors.get("torch")
+    for r in results:
+        if ref:
+            r["cosine_vs_torch"] = statistics.fmean(cosine(a, b) for a, b in zip(vectors[r["backend"]], ref))
+
+    print(f"{'backend':<10} {'load s':>7} {'load MB':>7} {'peak MB':>7} {'p50 ms':>7} {'p95 ms':>7} {'docs/s':>8} "
+          f"{'conc qps':>9} {'R@5':>6} {'MRR@5':>6} {'cos':>6}")
+    for r in results:
+        print(f"{r['backend']:<10} {r['load_s']:>7.2f} {r['model_load_rss_mb']:>7.0f} {r['peak_rss_mb']:>7.0f} "
+              f"{r['query_ms_p50']:>7.2f} {r['query_ms_p95']:>7.2f} {r['batch_docs_per_s']:>8.0f} {r['concurrent_qps']:>9.0f} "
+              f"{r[f'recall@{K}']:>6.3f} {r[f'mrr@{K}']:>6.3f} {r.get('cosine_vs_torch', float('nan')):>6.4f}")
+
+    OUT_JSON.parent.mkdir(parents=True, exist_ok=True)
+    with open(OUT_JSON, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {OUT_JSON}")
+
+if __name__ == "__main__":
+    main()
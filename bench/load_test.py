@@ -0,0 +1,219 @@
+import os, sys, json, time, random, argparse, threading, statistics, subprocess
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT / "eval") not in sys.path:
+    sys.path.insert(0, str(ROOT / "eval"))
+
+from runner import percentile
+
+QUESTION_FILES = [ROOT / "eval" / "seed_qas.jsonl", ROOT / "eval" / "gold_labels.jsonl"]
+BASELINE = ROOT / "bench" / "baseline.json"
+PERCENTILES = (50, 95, 99)
+
+def load_questions(paths):
+    qs = []
+    for path in paths:
+        if not path.exists():
+            continue
+        with open(path, "r", encoding="utf-8-sig") as f:
+            for raw in f:
+                s = raw.strip()
+                if not s or s.startswith("#") or s.startswith("//"):
+                    continue
+                ex = json.loads(s)
+                qs.append({"q": ex["q"].strip(), "mode": ex.get("mode", "short"),
+                           "k": ex.get("k", 5), "filters": ex.get("filters")})
+    return qs
+
+def summarize(values):
+    if not values:
+        return {"n": 0}
+    out = {"n": len(values), "mean": statistics.fmean(values), "max": max(values)}
+    for p in PERCENTILES:
+        out[f"p{p}"] = percentile(values, p)
+    return out
+
+def arrivals(rate, duration, n_max, poisson, rng):
+    # open-loop schedule: send times do not depend on how fast responses come back
+    t = 0.0
+    n = 0
+    while (duration is None or t < duration) and (n_max is None or n < n_max):
+        yield t
+        n += 1
+        t += rng.expovariate(rate) if poisson else 1.0 / rate
+
+def run_load(url, questions, rate, duration, n_max, concurrency, poisson, unique, seed, timeout):
+    import requests
+    rng = random.Random(seed)
+    local = threading.local()
+    results = []
+    lock = threading.Lock()
+
+    def send(scheduled, i, item):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        payload = {"q": item["q"] + (f" (#{i})" if unique else ""), "mode": item["mode"], "k": item["k"], "timings": True}
+        if item["filters"] is not None:
+            payload["filters"] = item["filters"]
+        started = time.perf_counter()
+        rec = {"queued_ms": (started - scheduled) * 1000}
+        try:
+            r = local.session.post(url + "/chat", json=payload, timeout=timeout)
+            rec["status"] = r.status_code
+            if r.ok:
+                js = r.json()
+                rec["degraded"] = bool(js.get("degraded"))
+                rec["timings"] = js.get("timings") or {}
+        except Exception as e:
+            rec["status"] = type(e).__name__
+        # latency counts from the scheduled send time to avoid coordinated omission
+        rec["latency_ms"] = (time.perf_counter() - scheduled) * 1000
+        with lock:
+            results.append(rec)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        t0 = time.perf_counter()
+        for i, offset in enumerate(arrivals(rate, duration, n_max, poisson, rng)):
+            delay = t0 + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            ex.submit(send, t0 + offset, i, rng.choice(questions))
+    wall = time.perf_counter() - t0
+    return results, wall
+
+def build_report(results, wall, config):
+    ok = [r for r in results if r["status"] == 200]
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    stages = {}
+    for r in ok:
+        for stage, ms in (r.get("timings") or {}).get("stages_ms", {}).items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        "requests": len(results),
+        "ok": len(ok),
+        "degraded": sum(1 for r in ok if r.get("degraded")),
+        "statuses": statuses,
+        "wall_s": wall,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+        "latency_ms": summarize([r["latency_ms"] for r in ok]),
+        "client_queue_ms": summarize([r["queued_ms"] for r in results]),
+        "stages_ms": {s: summarize(v) for s, v in sorted(stages.items())},
+    }
+
+def compare(report, baseline, tolerance):
+    # returns (rows, regressed); latency may grow and throughput shrink by at most `tolerance`
+    rows = []
+    regressed = False
+
+    def check(name, cur, base, higher_is_worse=True):
+        nonlocal regressed
+        if cur is None or not base:
+            return
+        delta = (cur - base) / base
+        bad = delta > tolerance if higher_is_worse else delta < -tolerance
+        regressed |= bad
+        rows.append((name, base, cur, delta, bad))
+
+    for p in PERCENTILES:
+        check(f"latency p{p}", report["latency_ms"].get(f"p{p}"), baseline.get("latency_ms", {}).get(f"p{p}"))
+    for stage, st in report["stages_ms"].items():
+        check(f"{stage} p95", st.get("p95"), baseline.get("stages_ms", {}).get(stage, {}).get("p95"))
+    check("throughput rps", report["throughput_rps"], baseline.get("throughput_rps"), higher_is_worse=False)
+    return rows, regressed
+
+def spawn_server(port, workers, stub_latency_ms):
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), LLM_BACKEND="stub",
+               LLM_STUB_LATENCY_MS=str(stub_latency_ms))
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"], cwd=ROOT, env=env)
+    import requests
+    deadline = time.time() + 180
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/ready", timeout=2).ok:
+                return proc
+        except Exception:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("server did not become ready")
+
+def main():
+    ap = argparse.ArgumentParser(description="Open-loop load test for /chat.")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--rate", type=float, default=5.0, help="arrival rate, requests/s")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals")
+    ap.add_argument("--requests", type=int, default=None, help="stop after N arrivals instead")
+    ap.add_argument("--concurrency", type=int, default=64, help="max client requests in flight")
+    ap.add_argument("--uniform", action="store_true", help="fixed inter-arrival gap instead of Poisson")
+    ap.add_argument("--unique", action="store_true", help="make every question unique (defeats coalescing)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--timeout", type=float, default=120)
+    ap.add_argument("--spawn", action="store_true", help="start gunicorn with the stub LLM for an offline run")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--stub-latency-ms", type=float, default=300)
+    ap.add_argument("--out", type=Path, default=ROOT / "bench" / "load_report.json")
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args()
+
+    questions = load_questions(QUESTION_FILES)
+    if not questions:
+        print("No questions found in " + ", ".join(str(p) for p in QUESTION_FILES))
+        sys.exit(1)
+
+    server = None
+    url = args.url.rstrip("/")
+    if args.spawn:
+        port = int(url.rsplit(":", 1)[-1]) if url.rsplit(":", 1)[-1].isdigit() else 8000
+        server = spawn_server(port, args.workers, args.stub_latency_ms)
+    try:
+        duration = None if args.requests else args.duration
+        results, wall = run_load(url, questions, args.rate, duration, args.requests, args.concurrency,
+                                 not args.uniform, args.unique, args.seed, args.timeout)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=60)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "save_baseline")}
+    report = build_report(results, wall, config)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    lat = report["latency_ms"]
+    print(f"{report['ok']}/{report['requests']} ok ({report['degraded']} degraded), "
+          f"{report['throughput_rps']:.2f} req/s, statuses {report['statuses']}")
+    if lat.get("n"):
+        print(f"latency ms: p50 {lat['p50']:.0f}  p95 {lat['p95']:.0f}  p99 {lat['p99']:.0f}  max {lat['max']:.0f}")
+    for stage, st in report["stages_ms"].items():
+        print(f"  {stage:<14} p50 {st['p50']:8.1f}  p95 {st['p95']:8.1f}  (n={st['n']})")
+    print(f"Wrote {args.out}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if args.baseline.exists():
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressed = compare(report, baseline, args.tolerance)
+        print(f"\nvs baseline {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for name, base, cur, delta, bad in rows:
+            print(f"  {name:<20} {base:10.1f} -> {cur:10.1f}  {delta:+7.1%}{'  REGRESSION' if bad else ''}")
+        sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
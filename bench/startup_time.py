@@ -0,0 +1,86 @@
+import os, re, sys, json, argparse, statistics, subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# cold start budget for "import app + first GET /health", in milliseconds
+HEALTH_BUDGET_MS = float(os.getenv("HEALTH_BUDGET_MS", "800"))
+# modules that must not be pulled in just by importing the web app
+HEAVY = ["torch", "sentence_transformers", "chromadb", "matplotlib", "numpy", "openai", "fitz"]
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+COLD_START = (
+    "import time; t0 = time.perf_counter(); import app; "
+    "r = app.app.test_client().get('/health'); "
+    "assert r.status_code == 200; print((time.perf_counter() - t0) * 1000)"
+)
+
+def importtime(module: str):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_RE.match(line)
+        if m:
+            self_us, cum_us, indent, name = m.groups()
+            rows.append({"module": name, "self_us": int(self_us), "cumulative_us": int(cum_us),
+                         "depth": len(indent) // 2})
+    return rows
+
+def cold_start_ms(runs: int):
+    times = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", COLD_START], cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        times.append(float(proc.stdout.strip().splitlines()[-1]))
+    return times
+
+def main():
+    ap = argparse.ArgumentParser(description="Import-time and cold-start benchmark for the AgroQA web app.")
+    ap.add_argument("--module", default="app")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--json", type=Path, default=None, help="optional path for a machine-readable report")
+    args = ap.parse_args()
+
+    rows = importtime(args.module)
+    top_level = [r for r in rows if r["module"] == args.module]
+    total_ms = (top_level[-1]["cumulative_us"] if top_level else sum(r["self_us"] for r in rows)) / 1000
+    heavy = sorted({r["module"].split(".")[0] for r in rows} & set(HEAVY))
+
+    times = cold_start_ms(args.runs)
+    median = statistics.median(times)
+
+    print(f"import {args.module}: {total_ms:.1f} ms cumulative")
+    print("Slowest imports (cumulative):")
+    for r in sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[: args.top]:
+        print(f"  {r['cumulative_us'] / 1000:8.1f} ms  {r['module']}")
+    print(f"Cold start to /health: median {median:.1f} ms over {len(times)} runs (budget {HEALTH_BUDGET_MS:.0f} ms)")
+    if heavy:
+        print("Heavy modules imported eagerly: " + ", ".join(heavy))
+
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "module": args.module,
+                "import_ms": total_ms,
+                "cold_start_ms": times,
+                "cold_start_median_ms": median,
+                "budget_ms": HEALTH_BUDGET_MS,
+                "heavy_imports": heavy,
+                "imports": rows,
+            }, f, indent=2)
+        print(f"Wrote {args.json}")
+
+    ok = median <= HEALTH_BUDGET_MS and not heavy
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import os, re, sys, csv, time, shutil, argparse, statistics
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for p in (ROOT, ROOT / "eval"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import ingest
+from score_retrieval import GOLD, load_gold, relevance, metrics_at
+
+SWEEP_DIR = ROOT / "indexes" / "sweep"
+OUT_TXT = ROOT / "bench" / "sweep_report.txt"
+OUT_CSV = ROOT / "bench" / "sweep_results.csv"
+
+CHUNK_SIZES = [600, 1200, 2000]
+OVERLAPS = [0, 200]
+MODELS = [ingest.EMB_MODEL]
+KS = [3, 5, 10]
+
+# (column, higher_is_better) used for Pareto dominance
+OBJECTIVES = [("recall", True), ("mrr", True), ("prompt_tokens", False), ("query_ms", False), ("index_mb", False)]
+
+def slug(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", s).strip("-").lower()
+
+def dir_size_mb(path: Path) -> float:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for fn in files:
+            total += os.path.getsize(os.path.join(dirpath, fn))
+    return total / (1024 * 1024)
+
+def token_counter():
+    try:
+        import tiktoken
+        enc = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(enc.encode(text))
+    except Exception:
+        return lambda text: len(text) // 4
+
+def pareto(rows):
+    # marks rows that no other row beats on every objective (and strictly on one)
+    def dominates(a, b):
+        ge = all((a[c] >= b[c]) if hi else (a[c] <= b[c]) for c, hi in OBJECTIVES)
+        gt = any((a[c] > b[c]) if hi else (a[c] < b[c]) for c, hi in OBJECTIVES)
+        return ge and gt
+    for r in rows:
+        r["pareto"] = not any(dominates(o, r) for o in rows if o is not r)
+    return rows
+
+def evaluate_config(retr, items, embeddings, ks, count_tokens):
+    from models import build_answer_prompt
+    depth = max(ks)
+    # query_ms times one search per question as /chat runs it, query encoding
+    # included, so a larger embedding model shows its latency cost
+    lat = []
+    for it in items:
+        t0 = time.perf_counter()
+        retr.search(it["q"], k=depth)
+        lat.append((time.perf_counter() - t0) * 1000)
+    # relevance uses the precomputed query vectors
+    results = retr.search_many([it["q"] for it in items], k=depth, embeddings=embeddings)
+
+    rows = []
+    for k in ks:
+        sums = {"recall": 0.0, "mrr": 0.0, "ndcg": 0.0}
+        tokens = []
+        for it, hits in zip(items, results):
+            rels = relevance(hits, it["expect_sources"], it["expect_pages"])
+            for name, v in metrics_at(rels, k).items():
+                sums[name] += v
+            prompt = build_answer_prompt(it["q"], hits[:k])
+            tokens.append(sum(count_tokens(m["content"]) for m in prompt))
+        n = len(items) or 1
+        rows.append({"k": k, **{name: v / n for name, v in sums.items()},
+                     "prompt_tokens": statistics.fmean(tokens) if tokens else 0.0,
+                     "query_ms": statistics.median(lat) if lat else 0.0})
+    return rows
+
+def write_outputs(rows):
+    cols = ["model", "chunk_size", "overlap", "k", "chunks", "index_mb", "ingest_s", "query_ms",
+            "prompt_tokens", "recall", "mrr", "ndcg", "pareto"]
+    with open(OUT_CSV, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=cols)
+        w.writeheader()
+        for r in rows:
+            w.writerow({c: r[c] for c in cols})
+
+    ordered = sorted(rows, key=lambda r: (not r["pareto"], -r["recall"], -r["mrr"], r["prompt_tokens"]))
+    with open(OUT_TXT, "w", encoding="utf-8") as f:
+        f.write("Chunking / index parameter sweep (* = Pareto-optimal on recall, MRR, prompt tokens, query ms, index MB)\n")
+        f.write(f"Gold: {GOLD}  Questions are scored unfiltered; MB and ingest s include the partition collections.\n\n")
+        f.write(f"  {'model':<28} {'size':>5} {'ovl':>4} {'k':>3} {'chunks':>7} {'MB':>7} {'ingest s':>9} "
+                f"{'query ms':>9} {'tokens':>7} {'R@k':>6} {'MRR@k':>6} {'nDCG@k':>6}\n")
+        for r in ordered:
+            f.write(f"{'*' if r['pareto'] else ' '} {r['model'][-28:]:<28} {r['chunk_size']:>5} {r['overlap']:>4} {r['k']:>3} "
+                    f"{r['chunks']:>7} {r['index_mb']:>7.1f} {r['ingest_s']:>9.1f} {r['query_ms']:>9.1f} "
+                    f"{r['prompt_tokens']:>7.0f} {r['recall']:>6.3f} {r['mrr']:>6.3f} {r['ndcg']:>6.3f}\n")
+
+def main():
+    ap = argparse.ArgumentParser(description="Sweep chunk size, overlap, embedding model and k.")
+    ap.add_argument("--chunk-sizes", type=int, nargs="+", default=CHUNK_SIZES)
+    ap.add_argument("--overlaps", type=int, nargs="+", default=OVERLAPS)
+    ap.add_argument("--models", nargs="+", default=MODELS)
+    ap.add_argument("--ks", type=int, nargs="+", default=KS)
+    ap.add_argument("--keep", action="store_true", help=f"keep the sweep indexes under {SWEEP_DIR}")
+    args = ap.parse_args()
+
+    # page text comes from ingest's cache, so only the first run pays for PDF extraction
+    os.chdir(ROOT)
+    items = load_gold(GOLD)
+    if not items:
+        print(f"No items loaded from {GOLD}")
+        return
+
+    from retriever import Retriever, make_embedding_function
+    count_tokens = token_counter()
+    ks = sorted(set(args.ks))
+    rows = []
+    for model in args.models:
+        emb_fn = make_embedding_function(model)
+        embeddings = emb_fn([it["q"] for it in items])
+        for size in args.chunk_sizes:
+            for overlap in args.overlaps:
+                if overlap >= size:
+                    continue
+                db_dir = SWEEP_DIR / f"{slug(model)}_{size}_{overlap}"
+                shutil.rmtree(db_dir, ignore_errors=True)
+                t0 = time.perf_counter()
+                chunks = ingest.build_index(db_dir=str(db_dir), collection="sweep", size=size,
+                                            overlap=overlap, emb_fn=emb_fn)
+                ingest_s = time.perf_counter() - t0
+                index_mb = dir_size_mb(db_dir)
+                retr = Retriever(embedding_function=emb_fn, db_dir=str(db_dir), collection="sweep")
+                for r in evaluate_config(retr, items, embeddings, ks, count_tokens):
+                    rows.append({"model": model, "chunk_size": size, "overlap": overlap, "chunks": chunks,
+                                 "index_mb": index_mb, "ingest_s": ingest_s, **r})
+                print(f"{model} size={size} overlap={overlap}: {chunks} chunks, {index_mb:.1f} MB, {ingest_s:.1f}s")
+                del retr
+                if not args.keep:
+                    shutil.rmtree(db_dir, ignore_errors=True)
+
+    write_outputs(pareto(rows))
+    print(f"Wrote {OUT_TXT}")
+    print(f"Wrote {OUT_CSV}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import re
+import json
+import threading
+
+class CoalesceTimeout(Exception):
+    pass
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    # Concurrent callers with the same key share one execution of fn: the first
+    # caller (the leader) runs it, the rest wait for its result or exception.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout: float | None = None):
+        # returns (result, shared); shared is True when another request computed it
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                # drop the key before waking waiters so later arrivals start a fresh call
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            return call.result, False
+
+        if not call.done.wait(timeout):
+            raise CoalesceTimeout(f"timed out after {timeout}s waiting for in-flight request")
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+def chat_key(q: str, mode: str, k, filters) -> str:
+    norm_q = re.sub(r"\s+", " ", q).strip().casefold()
+    return json.dumps([norm_q, mode, k, filters], sort_keys=True, default=str)
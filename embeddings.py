@@ -0,0 +1,196 @@
+import os
+import re
+import queue
+import threading
+from concurrent.futures import Future
+
+EMB_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# torch (sentence-transformers), onnx (fp32 export) or onnx-int8 (dynamically quantized export);
+# the onnx backends and the export command need requirements-onnx.txt
+EMB_BACKEND = os.getenv("EMB_BACKEND", "torch")
+EMB_THREADS = int(os.getenv("EMB_THREADS", "0"))  # 0 = runtime default
+EMB_ONNX_DIR = os.getenv("EMB_ONNX_DIR", "onnx_models")
+EMB_MAX_SEQ_LEN = 256
+# rows per ONNX session run; bounds activation memory for large ingest batches
+# (matches the SentenceTransformer.encode default used by the torch backend)
+EMB_ONNX_BATCH = 32
+# dynamic batching of concurrent query encodes (serving path only)
+EMB_DYNAMIC_BATCHING = os.getenv("EMB_DYNAMIC_BATCHING", "1") != "0"
+EMB_MAX_BATCH = int(os.getenv("EMB_MAX_BATCH", "32"))
+EMB_BATCH_WAIT_MS = float(os.getenv("EMB_BATCH_WAIT_MS", "2"))
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+def onnx_dir(model_name: str = EMB_MODEL) -> str:
+    return os.path.join(EMB_ONNX_DIR, re.sub(r"[^A-Za-z0-9]+", "-", model_name).strip("-").lower())
+
+class TorchEmbedder:
+    def __init__(self, model_name: str = EMB_MODEL, threads: int = EMB_THREADS):
+        from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self._fn = SentenceTransformerEmbeddingFunction(model_name=model_name)
+
+    def __call__(self, texts):
+        return self._fn(list(texts))
+
+class OnnxEmbedder:
+    # Mean pooling + L2 normalisation over an exported transformer, matching the
+    # sentence-transformers pipeline of all-MiniLM-L6-v2 (which normalises).
+    def __init__(self, model_name: str = EMB_MODEL, quantized: bool = False, threads: int = EMB_THREADS):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        d = onnx_dir(model_name)
+        path = os.path.join(d, "model.int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found; run `python embeddings.py export --model {model_name}`")
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+            opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._np = np
+        self._sess = ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self._sess.get_inputs()}
+        self._tok = Tokenizer.from_file(os.path.join(d, "tokenizer.json"))
+        self._tok.enable_truncation(EMB_MAX_SEQ_LEN)
+        self._tok.enable_padding()
+
+    def __call__(self, texts):
+        texts = list(texts)
+        out = []
+        for i in range(0, len(texts), EMB_ONNX_BATCH):
+            out.extend(self._encode(texts[i : i + EMB_ONNX_BATCH]))
+        return out
+
+    def _encode(self, texts):
+        np = self._np
+        enc = self._tok.encode_batch(texts)
+        ids = np.array([e.ids for e in enc], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in enc], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        hidden = self._sess.run(None, feed)[0]
+        m = mask[..., None].astype(hidden.dtype)
+        pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return [row for row in pooled]
+
+class BatchingEmbedder:
+    # Coalesces concurrent small encode calls into one model call. The worker
+    # thread is started lazily and restarted after fork (gunicorn preload).
+    def __init__(self, fn, max_batch: int = EMB_MAX_BATCH, wait_ms: float = EMB_BATCH_WAIT_MS):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self._lock = threading.Lock()
+        self._pid = None
+        self._q = None
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._q = queue.Queue()
+            threading.Thread(target=self._run, args=(self._q,), name="emb-batcher", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self, q):
+        while True:
+            batch = [q.get()]
+            n = len(batch[0][0])
+            try:
+                while n < self.max_batch:
+                    item = q.get(timeout=self.wait)
+                    batch.append(item)
+                    n += len(item[0])
+            except queue.Empty:
+                pass
+            texts = [t for item in batch for t in item[0]]
+            try:
+                vecs = self.fn(texts)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            i = 0
+            for item_texts, fut in batch:
+                fut.set_result(vecs[i : i + len(item_texts)])
+                i += len(item_texts)
+
+    def __call__(self, texts):
+        texts = list(texts)
+        # large batches (ingest, eval) gain nothing from waiting for company
+        if len(texts) >= self.max_batch:
+            return self.fn(texts)
+        self._ensure_worker()
+        fut = Future()
+        self._q.put((texts, fut))
+        return fut.result()
+
+def _as_chroma(fn, name: str):
+    # Chroma validates embedding functions by type/signature; wrap ours accordingly
+    from chromadb.api.types import EmbeddingFunction
+
+    class _ChromaEmbedding(EmbeddingFunction):
+        def __init__(self):
+            self.backend = fn
+            self.backend_name = name
+
+        def __call__(self, input):
+            return fn(input)
+
+    return _ChromaEmbedding()
+
+def make_embedding_function(model_name: str = EMB_MODEL, backend: str | None = None,
+                            threads: int | None = None, batching: bool | None = None):
+    backend = backend or EMB_BACKEND
+    threads = EMB_THREADS if threads is None else threads
+    batching = EMB_DYNAMIC_BATCHING if batching is None else batching
+    if backend == "torch":
+        fn = TorchEmbedder(model_name, threads)
+    elif backend in ("onnx", "onnx-int8"):
+        fn = OnnxEmbedder(model_name, quantized=backend == "onnx-int8", threads=threads)
+    else:
+        raise ValueError(f"Unknown EMB_BACKEND '{backend}' (expected one of {', '.join(BACKENDS)})")
+    if batching:
+        fn = BatchingEmbedder(fn)
+    return _as_chroma(fn, backend)
+
+def export_onnx(model_name: str = EMB_MODEL, quantize: bool = True) -> str:
+    # exports the transformer body; pooling/normalisation happen in OnnxEmbedder
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    out = onnx_dir(model_name)
+    os.makedirs(out, exist_ok=True)
+    tok = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tok.backend_tokenizer.save(os.path.join(out, "tokenizer.json"))
+    sample = tok(["warmup sentence"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dyn = {n: {0: "batch", 1: "seq"} for n in names}
+    dyn["last_hidden_state"] = {0: "batch", 1: "seq"}
+    path = os.path.join(out, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(model, tuple(sample[n] for n in names), path, input_names=names,
+                          output_names=["last_hidden_state"], dynamic_axes=dyn, opset_version=17)
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(path, os.path.join(out, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    return out
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Embedding backend utilities.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="export an ONNX (and int8) copy of the embedding model")
+    ex.add_argument("--model", default=EMB_MODEL)
+    ex.add_argument("--no-int8", action="store_true")
+    args = ap.parse_args()
+    if args.cmd == "export":
+        print("Exported to", export_onnx(args.model, quantize=not args.no_int8))
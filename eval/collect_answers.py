@@ -1,8 +1,8 @@
-import json, requests, time
+import os, json, argparse
 from pathlib import Path
 from datetime import datetime
+from runner import iter_jsonl, make_asker, run_ordered, add_common_args
 
-API = "http://localhost:8000/chat"
 GOLD = Path("eval/gold_labels.jsonl")
 OUT = Path("eval/answers.jsonl")
 
@@ -10,58 +10,99 @@ K = 5
 MODES = ["short", "long"]   # collect both to compare personalization
 
 def iter_gold(path: Path):
+    for ln, ex in iter_jsonl(path):
+        yield {
+            "id": ex.get("id", f"q{ln}"),
+            "q": ex["q"].strip(),
+            "filters": ex.get("filters")  # may be None
+        }
+
+def load_done(path: Path):
+    # (id, mode) pairs that already have a full (non-degraded) answer
+    done = set()
+    if not path.exists():
+        return done
+    for _, rec in iter_jsonl(path):
+        if rec.get("status") == "ok" and not rec.get("degraded"):
+            done.add((rec.get("id"), rec.get("mode")))
+    return done
+
+def compact(path: Path, order):
+    # after a resumed run, keep only the latest row per (id, mode) so retried
+    # questions are not scored twice, written back in gold order (`order` lists
+    # the (id, mode) keys; rows outside it follow in file order). Run metadata
+    # lines are kept first, in order.
+    metas, rows = [], {}
     with open(path, "r", encoding="utf-8-sig") as f:
-        for ln, raw in enumerate(f, 1):
+        for raw in f:
             s = raw.strip()
-            if not s or s.startswith("#") or s.startswith("//"):
+            if not s:
                 continue
-            ex = json.loads(s)
-            yield {
-                "id": ex.get("id", f"q{ln}"),
-                "q": ex["q"].strip(),
-                "filters": ex.get("filters")  # may be None
-            }
-
-def ask(q, mode="short", k=K, filters=None, timeout=90):
-    payload = {"q": q, "k": k, "mode": mode}
-    if filters is not None:
-        payload["filters"] = filters
-    r = requests.post(API, json=payload, timeout=timeout)
-    if not r.ok:
-        return None, f"http_{r.status_code}", r.text[:200]
-    try:
-        js = r.json()
-    except Exception as e:
-        return None, "json_error", str(e)
-    return js, "ok", ""
+            rec = json.loads(s)
+            if "_run_meta" in rec:
+                metas.append(s)
+            else:
+                rows[(rec.get("id"), rec.get("mode"))] = s
+    keys = [key for key in order if key in rows]
+    seen = set(keys)
+    keys += [key for key in rows if key not in seen]
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as out:
+        for s in metas + [rows[key] for key in keys]:
+            out.write(s + "\n")
+    os.replace(tmp, path)
+    return len(rows)
 
 def main():
+    ap = add_common_args(argparse.ArgumentParser(description="Collect answers for the gold questions."))
+    ap.add_argument("--resume", action="store_true", help=f"append to {OUT}, skipping ids already answered and retrying failed or degraded ones")
+    ap.add_argument("--modes", nargs="+", default=MODES)
+    args = ap.parse_args()
+
     OUT.parent.mkdir(parents=True, exist_ok=True)
+    done = load_done(OUT) if args.resume else set()
+    tasks = [(item, mode) for item in iter_gold(GOLD) for mode in args.modes
+             if (item["id"], mode) not in done]
+
+    ask = make_asker(args.inprocess, args.api)
+
+    def work(task):
+        item, mode = task
+        return ask(item["q"], mode=mode, k=K, filters=None)  # unfiltered pass
+
     n = 0
-    with open(OUT, "w", encoding="utf-8") as out:
+    with open(OUT, "a" if args.resume else "w", encoding="utf-8") as out:
         out.write(json.dumps({"_run_meta": {
-            "api": API, "gold": str(GOLD), "k": K,
+            "api": "inprocess" if args.inprocess else args.api, "gold": str(GOLD), "k": K,
+            "concurrency": args.concurrency, "resumed": bool(args.resume), "skipped": len(done),
             "timestamp": datetime.now().isoformat(timespec="seconds")
         }}) + "\n")
 
-        for item in iter_gold(GOLD):
-            for mode in MODES:
-                js, status, err = ask(item["q"], mode=mode, k=K, filters=None)  # unfiltered pass
-                rec = {
-                    "id": item["id"],
-                    "q": item["q"],
-                    "mode": mode,
-                    "filters": None,
-                    "status": status,
-                    "error": err,
-                    "answer": (js or {}).get("answer"),
-                    "citations": (js or {}).get("citations", [])
-                }
-                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
-                n += 1
-                time.sleep(0.1)
+        for (item, mode), (js, status, err, latency) in run_ordered(tasks, work, args.concurrency):
+            # retrieval-only answers served under overload are not real answers
+            degraded = bool((js or {}).get("degraded"))
+            rec = {
+                "id": item["id"],
+                "q": item["q"],
+                "mode": mode,
+                "filters": None,
+                "status": "degraded" if status == "ok" and degraded else status,
+                "degraded": degraded,
+                "error": err,
+                "answer": (js or {}).get("answer"),
+                "citations": (js or {}).get("citations", []),
+                "latency_ms": round(latency, 1),
+                "timings": (js or {}).get("timings"),
+            }
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            out.flush()
+            n += 1
 
-    print(f"Wrote {OUT} with {n} rows (both modes, unfiltered).")
+    if args.resume:
+        modes = list(dict.fromkeys(MODES + args.modes))
+        order = [(item["id"], mode) for item in iter_gold(GOLD) for mode in modes]
+        print(f"Compacted {OUT} to {compact(OUT, order)} rows (latest per id and mode, gold order).")
+    print(f"Wrote {OUT} with {n} rows ({', '.join(args.modes)}, unfiltered; {len(done)} already done).")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
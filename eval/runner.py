@@ -0,0 +1,95 @@
+import sys, json, math, time, threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+API = "http://localhost:8000/chat"
+ROOT = Path(__file__).resolve().parent.parent
+CONCURRENCY = 8
+
+def iter_jsonl(path: Path):
+    # yields (line_number, obj), skipping blanks, comments and run-meta lines
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for ln, raw in enumerate(f, 1):
+            s = raw.strip()
+            if not s or s.startswith("#") or s.startswith("//") or s.startswith("{\"_run_meta\""):
+                continue
+            yield ln, json.loads(s)
+
+def percentile(values, p):
+    # nearest-rank percentile, shared by the eval and bench reports
+    if not values:
+        return None
+    vals = sorted(values)
+    return vals[max(0, min(len(vals) - 1, math.ceil(p / 100 * len(vals)) - 1))]
+
+def http_asker(api: str = API, timeout: float = 90):
+    import requests
+    local = threading.local()
+
+    def ask(q, mode="short", k=5, filters=None):
+        # one keep-alive session per worker thread
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        payload = {"q": q, "k": k, "mode": mode, "timings": True}
+        if filters is not None:
+            payload["filters"] = filters
+        t0 = time.perf_counter()
+        try:
+            r = local.session.post(api, json=payload, timeout=timeout)
+        except Exception as e:
+            return None, "request_error", str(e), (time.perf_counter() - t0) * 1000
+        latency = (time.perf_counter() - t0) * 1000
+        if not r.ok:
+            return None, f"http_{r.status_code}", r.text[:200], latency
+        try:
+            js = r.json()
+        except Exception as e:
+            return None, "json_error", str(e), latency
+        return js, "ok", "", latency
+
+    return ask
+
+def inprocess_asker():
+    # calls the same pipeline as /chat without a Flask server
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    from dotenv import load_dotenv
+    load_dotenv(ROOT / ".env")
+    import app, metrics
+    app.get_retriever()
+
+    def ask(q, mode="short", k=5, filters=None):
+        timings = metrics.begin_request()
+        t0 = time.perf_counter()
+        try:
+            js = app.build_response(q, mode=mode, k=k, filters=filters)
+        except Exception as e:
+            return None, "error", f"{type(e).__name__}: {e}"[:200], (time.perf_counter() - t0) * 1000
+        latency = (time.perf_counter() - t0) * 1000
+        js = dict(js)
+        if timings is not None:
+            timings["total_ms"] = round(latency, 2)
+            js["timings"] = timings
+        return js, "ok", "", latency
+
+    return ask
+
+def make_asker(inprocess: bool = False, api: str = API):
+    return inprocess_asker() if inprocess else http_asker(api)
+
+def run_ordered(tasks, fn, concurrency: int = CONCURRENCY):
+    # runs fn over tasks concurrently and yields (task, result) in input order
+    tasks = list(tasks)
+    if concurrency <= 1:
+        for t in tasks:
+            yield t, fn(t)
+        return
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        for t, res in zip(tasks, ex.map(fn, tasks)):
+            yield t, res
+
+def add_common_args(ap):
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY, help="parallel requests (1 = sequential)")
+    ap.add_argument("--inprocess", action="store_true", help="call Retriever/models directly instead of the HTTP API")
+    ap.add_argument("--api", default=API)
+    return ap
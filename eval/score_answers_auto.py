@@ -1,11 +1,13 @@
-import json, re, statistics
+import json, re, sqlite3, hashlib, argparse, statistics
 from pathlib import Path
 from datetime import datetime
+from runner import percentile
 
 IN = Path("eval/answers.jsonl")
 OUT_TXT = Path("eval/answer_quality_report.txt")
 OUT_CSV = Path("eval/answer_quality_auto.csv")
 HUMAN_TEMPLATE = Path("eval/answer_quality_human_template.csv")
+DB = Path("eval/runs.sqlite")  # append-only run history + per-answer metrics cache
 
 BRACKET_RE = re.compile(r"\[(\d+)\]")
 
@@ -16,16 +18,24 @@ def sentences(text: str):
     parts = re.split(r'(?<=[.!?])\s+', text.strip())
     return [p.strip() for p in parts if p.strip()]
 
-def load_answers(path: Path):
-    rows = []
+def iter_answers(path: Path, meta: dict | None = None):
+    # streams answer rows; the last _run_meta line seen is copied into `meta`
     with open(path, "r", encoding="utf-8-sig") as f:
         for raw in f:
             s = raw.strip()
-            if not s or s.startswith("{\"_run_meta\""):
+            if not s:
                 continue
-            rec = json.loads(s)
-            rows.append(rec)
-    return rows
+            if s.startswith("{\"_run_meta\""):
+                if meta is not None:
+                    meta.update(json.loads(s)["_run_meta"])
+                continue
+            yield json.loads(s)
+
+def answer_hash(rec) -> str:
+    # metrics depend only on mode, answer text and citations
+    key = json.dumps([rec.get("mode"), rec.get("answer") or "", rec.get("citations") or []],
+                     sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
 
 def analyze(rec):
     ans = rec.get("answer") or ""
@@ -63,6 +73,46 @@ def analyze(rec):
         "short_len_ok": short_len_ok
     }
 
+def connect(path: Path = DB):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS metrics_cache (
+            hash TEXT PRIMARY KEY,
+            metrics TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            source TEXT NOT NULL,
+            label TEXT,
+            source_meta TEXT
+        );
+        CREATE TABLE IF NOT EXISTS run_rows (
+            run_id INTEGER NOT NULL REFERENCES runs(run_id),
+            row_no INTEGER NOT NULL,
+            id TEXT, mode TEXT, status TEXT, hash TEXT,
+            latency_ms REAL, prompt_tokens INTEGER, completion_tokens INTEGER,
+            sentences INTEGER, has_brackets INTEGER, unmatched_count INTEGER,
+            grounded_fraction REAL, short_len_ok INTEGER,
+            PRIMARY KEY (run_id, row_no)
+        );
+    """)
+    return db
+
+def cached_analyze(db, rec, stats):
+    h = answer_hash(rec)
+    row = db.execute("SELECT metrics FROM metrics_cache WHERE hash = ?", (h,)).fetchone()
+    if row:
+        stats["cached"] += 1
+        m = json.loads(row[0])
+    else:
+        stats["scored"] += 1
+        m = analyze(rec)
+        m.pop("id", None)
+        db.execute("INSERT OR REPLACE INTO metrics_cache (hash, metrics) VALUES (?, ?)", (h, json.dumps(m)))
+    return h, {"id": rec.get("id"), "mode": rec.get("mode"), **m}
+
 def write_human_template(rows):
     # Columns for human scoring: 1–5 scale + optional notes
     with open(HUMAN_TEMPLATE, "w", encoding="utf-8") as f:
@@ -70,55 +120,165 @@ def write_human_template(rows):
         for r in rows:
             f.write(f"{r['id']},{r['mode']},,,,,""\n")
 
-def main():
-    rows = load_answers(IN)
-    if not rows:
-        print(f"No rows in {IN}. Run collect_answers.py first.")
+def score(src: Path = IN, label: str | None = None):
+    if not src.exists():
+        print(f"No rows in {src}. Run collect_answers.py first.")
         return
 
-    per = [analyze(r) for r in rows]
+    db = connect()
+    meta = {}
+    stats = {"scored": 0, "cached": 0}
+    run_id = db.execute("INSERT INTO runs (created_at, source, label) VALUES (?, ?, ?)",
+                        (datetime.now().isoformat(timespec="seconds"), str(src), label)).lastrowid
 
-    # aggregate by mode
+    # per-mode accumulators only; rows are streamed straight to the CSVs and the DB
     modes = {}
-    for p in per:
-        m = p["mode"]
-        modes.setdefault(m, []).append(p)
+    human = []
+    with open(OUT_CSV, "w", encoding="utf-8") as csv_out:
+        csv_out.write("id,mode,sentences,has_brackets,unmatched_count,grounded_fraction,short_len_ok\n")
+        for row_no, rec in enumerate(iter_answers(src, meta)):
+            h, x = cached_analyze(db, rec, stats)
+            tokens = (rec.get("timings") or {}).get("tokens") or {}
+            # degraded (retrieval-only) answers never count towards the ok rate
+            status = "degraded" if rec.get("degraded") else rec.get("status")
+            db.execute(
+                "INSERT INTO run_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, row_no, x["id"], x["mode"], status, h, rec.get("latency_ms"),
+                 tokens.get("prompt"), tokens.get("completion"), x["sentences"], int(x["has_brackets"]),
+                 len(x["unmatched_citation_numbers"]), x["grounded_fraction"],
+                 None if x["short_len_ok"] is None else int(x["short_len_ok"])))
+            csv_out.write(f"{x['id']},{x['mode']},{x['sentences']},{int(x['has_brackets'])},{len(x['unmatched_citation_numbers'])},{x['grounded_fraction']:.2f},{'' if x['short_len_ok'] is None else int(x['short_len_ok'])}\n")
+
+            acc = modes.setdefault(x["mode"], {"n": 0, "sent": [], "grounded": 0.0, "has_br": 0, "unmatched": 0,
+                                               "short_ok": 0, "short_n": 0, "latency": []})
+            acc["n"] += 1
+            acc["sent"].append(x["sentences"])
+            acc["grounded"] += x["grounded_fraction"]
+            acc["has_br"] += int(x["has_brackets"])
+            acc["unmatched"] += int(bool(x["unmatched_citation_numbers"]))
+            if x["short_len_ok"] is not None:
+                acc["short_n"] += 1
+                acc["short_ok"] += int(x["short_len_ok"])
+            if rec.get("latency_ms") is not None:
+                acc["latency"].append(rec["latency_ms"])
+            human.append({"id": x["id"], "mode": x["mode"]})
+
+    db.execute("UPDATE runs SET source_meta = ? WHERE run_id = ?", (json.dumps(meta), run_id))
+    db.commit()
+    db.close()
+
+    if not modes:
+        print(f"No rows in {src}. Run collect_answers.py first.")
+        return
 
     OUT_TXT.parent.mkdir(parents=True, exist_ok=True)
     with open(OUT_TXT, "w", encoding="utf-8") as f:
         f.write("Answer Quality (automatic checks)\n")
-        f.write(f"Run: {datetime.now().isoformat(timespec='seconds')}\n")
-        f.write(f"Source: {IN}\n\n")
-
-        for m, items in modes.items():
-            sent_counts = [x["sentences"] for x in items]
-            grounded = [x["grounded_fraction"] for x in items]
-            has_br = sum(1 for x in items if x["has_brackets"])
-            unmatched_any = sum(1 for x in items if x["unmatched_citation_numbers"])
+        f.write(f"Run: {datetime.now().isoformat(timespec='seconds')} (run_id {run_id}{', ' + label if label else ''})\n")
+        f.write(f"Source: {src}\n")
+        f.write(f"Scored: {stats['scored']} new, {stats['cached']} from cache\n\n")
+
+        for m, acc in modes.items():
+            n = acc["n"]
             f.write(f"Mode: {m}\n")
-            f.write(f"  N: {len(items)}\n")
-            f.write(f"  Avg sentences: {statistics.mean(sent_counts):.2f}\n")
-            f.write(f"  Median sentences: {statistics.median(sent_counts):.0f}\n")
-            f.write(f"  Answers with any [#]: {has_br}/{len(items)}\n")
-            f.write(f"  Answers with unmatched [#]: {unmatched_any}/{len(items)}\n")
-            f.write(f"  Avg grounded sentence fraction: {statistics.mean(grounded):.2f}\n")
-            if m == "short":
-                short_ok = [x["short_len_ok"] for x in items if x["short_len_ok"] is not None]
-                if short_ok:
-                    f.write(f"  Short length in 3–5 sentences: {sum(1 for v in short_ok if v)}/{len(short_ok)}\n")
+            f.write(f"  N: {n}\n")
+            f.write(f"  Avg sentences: {statistics.mean(acc['sent']):.2f}\n")
+            f.write(f"  Median sentences: {statistics.median(acc['sent']):.0f}\n")
+            f.write(f"  Answers with any [#]: {acc['has_br']}/{n}\n")
+            f.write(f"  Answers with unmatched [#]: {acc['unmatched']}/{n}\n")
+            f.write(f"  Avg grounded sentence fraction: {acc['grounded'] / n:.2f}\n")
+            if m == "short" and acc["short_n"]:
+                f.write(f"  Short length in 3–5 sentences: {acc['short_ok']}/{acc['short_n']}\n")
+            if acc["latency"]:
+                f.write(f"  Latency p50/p95 ms: {percentile(acc['latency'], 50):.0f}/{percentile(acc['latency'], 95):.0f}\n")
             f.write("\n")
 
-    # detailed CSV per answer
-    with open(OUT_CSV, "w", encoding="utf-8") as f:
-        f.write("id,mode,sentences,has_brackets,unmatched_count,grounded_fraction,short_len_ok\n")
-        for x in per:
-            f.write(f"{x['id']},{x['mode']},{x['sentences']},{int(x['has_brackets'])},{len(x['unmatched_citation_numbers'])},{x['grounded_fraction']:.2f},{'' if x['short_len_ok'] is None else int(x['short_len_ok'])}\n")
-
-    write_human_template(rows)
+    write_human_template(human)
 
+    print(f"Recorded run {run_id} in {DB} ({stats['scored']} scored, {stats['cached']} cached)")
     print(f"Wrote {OUT_TXT}")
     print(f"Wrote {OUT_CSV}")
     print(f"Wrote {HUMAN_TEMPLATE} (fill 1–5 rubric by hand, then you can average per mode)")
 
+def _resolve_run(db, ref: str) -> int:
+    if ref in ("latest", "previous"):
+        ids = [r[0] for r in db.execute("SELECT run_id FROM runs ORDER BY run_id DESC LIMIT 2")]
+        idx = 0 if ref == "latest" else 1
+        if len(ids) <= idx:
+            raise SystemExit(f"No {ref} run in {DB}")
+        return ids[idx]
+    return int(ref)
+
+def run_summary(db, run_id: int) -> dict:
+    out = {}
+    rows = db.execute(
+        "SELECT mode, sentences, has_brackets, unmatched_count, grounded_fraction, short_len_ok, "
+        "latency_ms, prompt_tokens, completion_tokens, status FROM run_rows WHERE run_id = ?", (run_id,))
+    by_mode = {}
+    for r in rows:
+        by_mode.setdefault(r[0], []).append(r)
+    for mode, rs in by_mode.items():
+        n = len(rs)
+        lat = [r[6] for r in rs if r[6] is not None]
+        ptok = [r[7] for r in rs if r[7] is not None]
+        ctok = [r[8] for r in rs if r[8] is not None]
+        short = [r[5] for r in rs if r[5] is not None]
+        out[mode] = {
+            "N": n,
+            "ok rate": sum(1 for r in rs if r[9] in (None, "ok")) / n,
+            "avg sentences": statistics.mean(r[1] for r in rs),
+            "with [#] rate": sum(r[2] for r in rs) / n,
+            "unmatched [#] rate": sum(1 for r in rs if r[3]) / n,
+            "avg grounded frac": statistics.mean(r[4] for r in rs),
+            "short 3-5 rate": (sum(short) / len(short)) if short else None,
+            "latency p50 ms": percentile(lat, 50) if lat else None,
+            "latency p95 ms": percentile(lat, 95) if lat else None,
+            "avg prompt tokens": statistics.mean(ptok) if ptok else None,
+            "avg completion tokens": statistics.mean(ctok) if ctok else None,
+        }
+    return out
+
+def compare(ref_a: str, ref_b: str):
+    db = connect()
+    a, b = _resolve_run(db, ref_a), _resolve_run(db, ref_b)
+    sa, sb = run_summary(db, a), run_summary(db, b)
+    db.close()
+    print(f"Run {a} -> run {b}")
+    for mode in sorted(set(sa) | set(sb)):
+        print(f"\nMode: {mode}")
+        ma, mb = sa.get(mode, {}), sb.get(mode, {})
+        for name in (ma or mb):
+            va, vb = ma.get(name), mb.get(name)
+            fmt = lambda v: "-" if v is None else f"{v:.3f}" if isinstance(v, float) else str(v)
+            delta = f"{vb - va:+.3f}" if va is not None and vb is not None else ""
+            print(f"  {name:<22} {fmt(va):>10} {fmt(vb):>10} {delta:>10}")
+
+def list_runs():
+    db = connect()
+    for run_id, created, source, label, n in db.execute(
+            "SELECT r.run_id, r.created_at, r.source, r.label, COUNT(x.row_no) FROM runs r "
+            "LEFT JOIN run_rows x ON x.run_id = r.run_id GROUP BY r.run_id ORDER BY r.run_id"):
+        print(f"{run_id:>5}  {created}  {n:>5} rows  {source}{'  [' + label + ']' if label else ''}")
+    db.close()
+
+def main():
+    ap = argparse.ArgumentParser(description="Automatic answer-quality checks with run history.")
+    sub = ap.add_subparsers(dest="cmd")
+    sc = sub.add_parser("score", help="score an answers.jsonl and record it as a new run (default)")
+    sc.add_argument("--input", type=Path, default=IN)
+    sc.add_argument("--label", default=None)
+    sub.add_parser("runs", help="list recorded runs")
+    cp = sub.add_parser("compare", help="metric and latency deltas between two runs")
+    cp.add_argument("run_a", help="run id, 'latest' or 'previous'")
+    cp.add_argument("run_b", help="run id, 'latest' or 'previous'")
+    args = ap.parse_args()
+
+    if args.cmd == "runs":
+        list_runs()
+    elif args.cmd == "compare":
+        compare(args.run_a, args.run_b)
+    else:
+        score(getattr(args, "input", IN), getattr(args, "label", None))
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
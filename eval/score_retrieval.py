@@ -1,11 +1,13 @@
-import json, requests, math
+import sys, json, math, time, argparse
 from pathlib import Path
+from runner import ROOT
 
-API = "http://localhost:8000/chat"
 GOLD = Path("eval/gold_labels.jsonl")
 OUT_TXT = Path("eval/retrieval_report.txt")
 
-K = 5  # top-k
+K = 5  # top-k served by /chat
+KS = [1, 3, 5, 10, 20]  # all cutoffs are computed from one fetch of max(KS)
+BATCH = 64
 
 def load_gold(path: Path):
     items = []
@@ -46,73 +48,99 @@ def match(citation, expect_sources, expect_pages):
         return within_pages(pg, expect_pages)
     return False
 
-def ask(q, k=K, mode="short", filters=None):
-    payload = {"q": q, "k": k, "mode": mode}
-    if filters is not None:
-        payload["filters"] = filters
-    try:
-        r = requests.post(API, json=payload, timeout=90)
-    except Exception:
-        return None
-    if not r.ok:
-        return None
-    return r.json()
-
-def evaluate(items, use_filters=False):
-    hits = 0
-    rr_sum = 0.0
+def relevance(hits, expect_sources, expect_pages):
+    return [match({"source": h["meta"].get("source"), "page": h["meta"].get("page")}, expect_sources, expect_pages)
+            for h in hits]
+
+def metrics_at(rels, k):
+    # binary relevance; the ideal ranking for nDCG uses the relevant chunks
+    # found in the deep fetch, since the full relevant set is not labelled
+    top = rels[:k]
+    first = next((i for i, r in enumerate(top, start=1) if r), None)
+    dcg = sum(1.0 / math.log2(i + 1) for i, r in enumerate(top, start=1) if r)
+    n_rel = min(sum(rels), k)
+    idcg = sum(1.0 / math.log2(i + 1) for i in range(1, n_rel + 1))
+    return {
+        "recall": 1.0 if first else 0.0,
+        "mrr": 1.0 / first if first else 0.0,
+        "ndcg": dcg / idcg if idcg else 0.0,
+    }
+
+def search_all(retr, items, embeddings, use_filters=False, depth=max(KS)):
+    # group questions by filter so each group is a handful of batched Chroma queries
+    groups = {}
+    for i, it in enumerate(items):
+        flt = it["filters"] if use_filters else None
+        groups.setdefault(json.dumps(flt, sort_keys=True), []).append(i)
+
+    results = [None] * len(items)
+    for key, idxs in groups.items():
+        flt = json.loads(key)
+        for b in range(0, len(idxs), BATCH):
+            chunk = idxs[b : b + BATCH]
+            hits = retr.search_many([items[i]["q"] for i in chunk], k=depth, filters=flt,
+                                    embeddings=[embeddings[i] for i in chunk])
+            for i, h in zip(chunk, hits):
+                results[i] = h
+    return results
+
+def evaluate(items, results, ks=KS):
+    totals = {k: {"recall": 0.0, "mrr": 0.0, "ndcg": 0.0} for k in ks}
     n = 0
-
-    for it in items:
-        q = it["q"]
-        expect_sources = it["expect_sources"]
-        expect_pages = it["expect_pages"]
-        filters = it["filters"] if use_filters else None
-
-        js = ask(q, k=K, mode="short", filters=filters)
-        if not js or "citations" not in js:
+    for it, hits in zip(items, results):
+        if hits is None:
             continue
-
-        cits = js["citations"][:K]
         n += 1
-        found_rank = None
-        for i, c in enumerate(cits, start=1):
-            if match(c, expect_sources, expect_pages):
-                found_rank = i
-                break
-
-        if found_rank is not None:
-            hits += 1
-            rr_sum += 1.0 / found_rank
-
-    recall = hits / n if n else 0.0
-    mrr = rr_sum / n if n else 0.0
-    return recall, mrr, n
-
-def write_outputs(recall_unf, mrr_unf, n_unf, recall_filt, mrr_filt, n_filt):
+        rels = relevance(hits, it["expect_sources"], it["expect_pages"])
+        for k in ks:
+            for name, v in metrics_at(rels, k).items():
+                totals[k][name] += v
+    return {k: {name: (v / n if n else 0.0) for name, v in m.items()} for k, m in totals.items()}, n
+
+def _table(scores, n):
+    lines = [f"Questions: {n}", f"{'k':>4}  {'Recall@k':>9}  {'MRR@k':>7}  {'nDCG@k':>7}"]
+    for k, m in scores.items():
+        lines.append(f"{k:>4}  {m['recall']:>9.3f}  {m['mrr']:>7.3f}  {m['ndcg']:>7.3f}")
+    return "\n".join(lines) + "\n"
+
+def write_outputs(unf, n_unf, filt, n_filt, elapsed):
     OUT_TXT.parent.mkdir(parents=True, exist_ok=True)
     with open(OUT_TXT, "w", encoding="utf-8") as f:
         f.write("Retrieval Evaluation\n")
-        f.write(f"API: {API}\n")
-        f.write(f"K: {K}\n\n")
+        f.write("Path: Retriever (direct, no LLM)\n")
+        f.write(f"Depth: {max(KS)}  Elapsed: {elapsed:.2f}s\n\n")
         f.write("== Unfiltered ==\n")
-        f.write(f"Questions: {n_unf}\nRecall@{K}: {recall_unf:.3f}\nMRR@{K}: {mrr_unf:.3f}\n\n")
+        f.write(_table(unf, n_unf) + "\n")
         f.write("== With Filters ==\n")
-        f.write(f"Questions: {n_filt}\nRecall@{K}: {recall_filt:.3f}\nMRR@{K}: {mrr_filt:.3f}\n")
+        f.write(_table(filt, n_filt))
 
 def main():
+    ap = argparse.ArgumentParser(description="Score retrieval against the gold labels without calling the LLM.")
+    ap.add_argument("--ks", type=int, nargs="+", default=KS)
+    args = ap.parse_args()
+    ks = sorted(set(args.ks))
+
     items = load_gold(GOLD)
     if not items:
         print(f"No items loaded from {GOLD}")
         return
 
-    recall_unf, mrr_unf, n_unf = evaluate(items, use_filters=False)
-    recall_filt, mrr_filt, n_filt = evaluate(items, use_filters=True)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    from retriever import Retriever
+
+    t0 = time.perf_counter()
+    retr = Retriever()
+    # every question is embedded once and reused for both passes
+    embeddings = retr.embed([it["q"] for it in items])
+    unf, n_unf = evaluate(items, search_all(retr, items, embeddings, use_filters=False, depth=max(ks)), ks)
+    filt, n_filt = evaluate(items, search_all(retr, items, embeddings, use_filters=True, depth=max(ks)), ks)
+    elapsed = time.perf_counter() - t0
 
-    write_outputs(recall_unf, mrr_unf, n_unf, recall_filt, mrr_filt, n_filt)
-    print(f"Wrote {OUT_TXT}")
-    print(f"Unfiltered: Recall@{K}={recall_unf:.3f}, MRR@{K}={mrr_unf:.3f} over {n_unf} Qs")
-    print(f"Filtered: Recall@{K}={recall_filt:.3f}, MRR@{K}={mrr_filt:.3f} over {n_filt} Qs")
+    write_outputs(unf, n_unf, filt, n_filt, elapsed)
+    print(f"Wrote {OUT_TXT} in {elapsed:.2f}s")
+    print(f"Unfiltered: Recall@{K}={unf.get(K, {}).get('recall', 0):.3f}, MRR@{K}={unf.get(K, {}).get('mrr', 0):.3f} over {n_unf} Qs")
+    print(f"Filtered: Recall@{K}={filt.get(K, {}).get('recall', 0):.3f}, MRR@{K}={filt.get(K, {}).get('mrr', 0):.3f} over {n_filt} Qs")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -9,8 +9,11 @@ from typing import List, Tuple, Optional, Iterable
 import requests
 from bs4 import BeautifulSoup
 
+from ingest import MANIFEST_NAME, load_manifest
+
 SEEDS_FILE = "seeds.jsonl"
 SRC_DIR = os.path.join("data", "raw")
+MANIFEST_FILE = os.path.join(SRC_DIR, MANIFEST_NAME)
 os.makedirs(SRC_DIR, exist_ok=True)
 
 HDRS = {"User-Agent": "AgroQA-pdf-fetcher/0.1 (+contact@example.com)"}
@@ -198,7 +201,28 @@ def download_pdf(url: str) -> Tuple[bool, Optional[str]]:
 
     return False, None
 
-def process_seed(seed: dict):
+def record_provenance(manifest: dict, path: str, url: str, seed: dict):
+    # appends a record when the file is new or its seed tags changed; load_manifest lets later lines win
+    name = os.path.basename(path)
+    tags = seed.get("tags") or {}
+    focus = tags.get("focus") or []
+    rec = {
+        "file": name,
+        "url": url,
+        "domain": seed.get("domain"),
+        "publisher": tags.get("publisher"),
+        "license": tags.get("license"),
+        "focus": focus if isinstance(focus, list) else [focus],
+    }
+    prev = manifest.get(name)
+    if prev and all(prev.get(k) == v for k, v in rec.items() if k not in ("file", "url")):
+        return
+    rec["fetched_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(MANIFEST_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    manifest[name] = rec
+
+def process_seed(seed: dict, manifest: dict):
     allow = compile_patterns(seed.get("allow") or [])
     deny = compile_patterns(seed.get("deny") or [])
     # accept both "sitemaps" and "sitemap_urls"
@@ -223,6 +247,8 @@ def process_seed(seed: dict):
                 continue
 
             downloaded, path = download_pdf(cu)
+            if path:
+                record_provenance(manifest, path, cu, seed)
             if downloaded and path:
                 print("saved:", path)
                 time.sleep(SLEEP_BETWEEN_DOWNLOADS)
@@ -234,6 +260,7 @@ def main():
         print(f"Missing {SEEDS_FILE}. Create it with one JSON object per line.")
         return
 
+    manifest = load_manifest(SRC_DIR)
     with open(SEEDS_FILE, "r", encoding="utf-8") as f:
         for line in f:
             line = line.strip()
@@ -244,7 +271,7 @@ def main():
             except json.JSONDecodeError as e:
                 print("seeds.jsonl parse error:", e)
                 continue
-            process_seed(seed)
+            process_seed(seed, manifest)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
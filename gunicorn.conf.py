@@ -0,0 +1,45 @@
+import os
+import signal
+import threading
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+# every /chat that admission control may hold (running or queued, see app.py)
+# needs its own thread; otherwise requests wait in gunicorn's unbounded queue,
+# outside the gate's deadline, and shedding/degraded mode never trigger. The
+# extra threads keep /ready and /metrics responsive while the gate is full.
+_llm_slots = int(os.getenv("LLM_MAX_CONCURRENCY", "8")) + int(os.getenv("LLM_MAX_QUEUE", "32"))
+threads = int(os.getenv("GUNICORN_THREADS", str(_llm_slots + 4)))
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "60"))
+keepalive = 5
+# seconds a worker keeps serving with /ready at 503 after SIGTERM, so the load
+# balancer notices before the listening socket closes; keep it below graceful_timeout
+drain_seconds = float(os.getenv("DRAIN_SECONDS", "10"))
+accesslog = "-"
+
+def post_fork(server, worker):
+    import wsgi
+    # runs before the worker accepts connections, so it never serves cold
+    wsgi.agroqa.warmup(embedding_function=wsgi.embedding_function)
+    server.log.info("worker %s warmed up", worker.pid)
+
+def post_worker_init(worker):
+    # on SIGTERM, flip /ready to 503 but keep accepting for drain_seconds, then
+    # re-deliver SIGTERM to gunicorn's own handler for the normal graceful exit
+    import wsgi
+    prev = signal.getsignal(signal.SIGTERM)
+
+    def _drain(signum, frame):
+        wsgi.agroqa.mark_draining()
+        # a second SIGTERM during the window exits immediately
+        signal.signal(signal.SIGTERM, prev)
+        worker.log.info("worker %s draining for %.0fs", worker.pid, drain_seconds)
+        timer = threading.Timer(drain_seconds, os.kill, (worker.pid, signal.SIGTERM))
+        timer.daemon = True
+        timer.start()
+
+    if drain_seconds > 0:
+        signal.signal(signal.SIGTERM, _drain)
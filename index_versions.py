@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import shutil
+from datetime import datetime
+
+# Blue/green index layout: every ingest builds a fresh Chroma directory under
+# VERSIONS_DIR and then atomically rewrites ACTIVE_FILE to point at it.
+# Readers (Retriever) poll the pointer and hot-swap; superseded versions are
+# deleted once they have been retired for longer than the grace period.
+INDEX_ROOT = "indexes"
+VERSIONS_DIR = os.path.join(INDEX_ROOT, "versions")
+ACTIVE_FILE = os.path.join(INDEX_ROOT, "ACTIVE.json")
+GC_GRACE_SECONDS = float(os.getenv("INDEX_GC_GRACE_SECONDS", "3600"))
+
+def read_active() -> dict | None:
+    try:
+        with open(ACTIVE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def active_mtime() -> int | None:
+    try:
+        return os.stat(ACTIVE_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def new_version() -> tuple[str, str]:
+    version = datetime.now().strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+    path = os.path.join(VERSIONS_DIR, version)
+    os.makedirs(path, exist_ok=False)
+    return version, path
+
+def activate(version: str, path: str, collection: str, chunks: int | None = None) -> dict:
+    prev = read_active() or {}
+    retired = dict(prev.get("retired") or {})
+    if prev.get("version") and prev["version"] != version:
+        retired[prev["version"]] = time.time()
+    retired.pop(version, None)
+    state = {
+        "version": version,
+        "path": path,
+        "collection": collection,
+        "chunks": chunks,
+        "activated_at": time.time(),
+        "retired": retired,
+    }
+    # write-then-rename so readers never see a partial pointer
+    os.makedirs(INDEX_ROOT, exist_ok=True)
+    tmp = ACTIVE_FILE + f".{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ACTIVE_FILE)
+    return state
+
+def gc(grace_seconds: float = GC_GRACE_SECONDS) -> list[str]:
+    # remove retired versions past the grace period, plus orphaned build dirs
+    # (failed ingests) that were never activated and are older than the grace period
+    state = read_active()
+    if not state:
+        return []
+    now = time.time()
+    retired = dict(state.get("retired") or {})
+    removed = []
+    try:
+        names = os.listdir(VERSIONS_DIR)
+    except OSError:
+        names = []
+    for name in names:
+        if name == state["version"]:
+            continue
+        path = os.path.join(VERSIONS_DIR, name)
+        since = retired.get(name, os.path.getmtime(path))
+        if now - since < grace_seconds:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        retired.pop(name, None)
+        removed.append(name)
+    if removed:
+        # drop the GC'd entries from the pointer without changing the active version
+        fresh = read_active() or {}
+        if fresh.get("version") == state["version"]:
+            fresh["retired"] = {v: t for v, t in (fresh.get("retired") or {}).items() if v not in removed}
+            tmp = ACTIVE_FILE + f".{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(fresh, f, indent=2)
+            os.replace(tmp, ACTIVE_FILE)
+    return removed
@@ -1,62 +1,207 @@
 import os
+import json
 import uuid
-import fitz
-from typing import Iterator, Tuple
-import chromadb
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+import argparse
+import index_versions
+from retriever import PARTITION_FIELDS, tag_slug, partition_name, make_embedding_function
+from typing import Iterator, List, Tuple
 
 SRC_DIR = "data/raw"
 DB_DIR = "indexes/chroma"
 COLLECTION_NAME = "agroqa"
 EMB_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+PAGE_CACHE_DIR = "data/processed/pages"
+MANIFEST_NAME = "manifest.jsonl"
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 200
+BATCH_SIZE = 1000
+VALIDATION_QUERY = "irrigation scheduling for corn"
+MIN_CHUNK_RATIO = 0.5  # refuse to activate an index much smaller than the live one
 
 def iter_pdf_pages(path: str) -> Iterator[Tuple[int, str]]:
+    import fitz
     doc = fitz.open(path)
     for i, page in enumerate(doc):
         yield i + 1, page.get_text("text")
 
-def chunk_text(text: str, size: int = 1200, overlap: int = 200):
+def load_pages(path: str) -> List[Tuple[int, str]]:
+    # PDF text extraction is the slow part of re-ingesting; cache it per file,
+    # invalidated by size + mtime, so re-chunking with other settings is cheap
+    st = os.stat(path)
+    cache = os.path.join(PAGE_CACHE_DIR, os.path.basename(path) + ".json")
+    try:
+        with open(cache, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("size") == st.st_size and cached.get("mtime") == st.st_mtime:
+            return [tuple(p) for p in cached["pages"]]
+    except (OSError, ValueError, KeyError):
+        pass
+    pages = list(iter_pdf_pages(path))
+    os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+    tmp = cache + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"size": st.st_size, "mtime": st.st_mtime, "pages": pages}, f, ensure_ascii=False)
+    os.replace(tmp, cache)
+    return pages
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
     i = 0
     n = len(text)
     while i < n:
         yield text[i : i + size]
         i += max(1, size - overlap)
 
-def main():
-    os.makedirs(DB_DIR, exist_ok=True)
-    os.makedirs("data/processed", exist_ok=True)
-    client = chromadb.PersistentClient(path=DB_DIR)
-    emb_fn = SentenceTransformerEmbeddingFunction(model_name=EMB_MODEL)
-    col = client.get_or_create_collection(name=COLLECTION_NAME, embedding_function=emb_fn)
+def load_manifest(src_dir: str = SRC_DIR) -> dict:
+    # provenance written by fetch_pdfs.py: file name -> {url, domain, publisher, license, focus}
+    out = {}
+    path = os.path.join(src_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return out
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if rec.get("file"):
+                out[rec["file"]] = rec
+    return out
 
-    total = 0
-    docs, ids, metas = [], [], []
+def doc_metadata(prov: dict | None) -> dict:
+    # Chroma metadata must be scalar: list-valued focus tags become one string
+    # plus a boolean topic_<slug> flag per tag so they can be filtered exactly
+    if not prov:
+        return {}
+    meta = {k: str(prov[k]) for k in ("publisher", "license", "domain", "url") if prov.get(k)}
+    focus = [str(t) for t in prov.get("focus") or [] if t]
+    if focus:
+        meta["focus"] = ", ".join(focus)
+        for t in focus:
+            meta[f"topic_{tag_slug(t)}"] = True
+    return meta
+
+def partition_keys(prov: dict | None, fields=PARTITION_FIELDS) -> list[tuple[str, str]]:
+    if not prov:
+        return []
+    keys = []
+    if "publisher" in fields and prov.get("publisher"):
+        keys.append(("publisher", prov["publisher"]))
+    if "topic" in fields:
+        keys.extend(("topic", t) for t in prov.get("focus") or [] if t)
+    return keys
 
-    for name in os.listdir(SRC_DIR):
+def iter_chunks(src_dir: str = SRC_DIR, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+    # yields (text, metadata, [(partition field, value), ...])
+    manifest = load_manifest(src_dir)
+    for name in sorted(os.listdir(src_dir)):
         if not name.lower().endswith(".pdf"):
             continue
-        src_path = os.path.join(SRC_DIR, name)
-        for page_num, text in iter_pdf_pages(src_path):
+        src_path = os.path.join(src_dir, name)
+        prov = manifest.get(name)
+        base = doc_metadata(prov)
+        parts = partition_keys(prov)
+        for page_num, text in load_pages(src_path):
             if not text or not text.strip():
                 continue
-            for c in chunk_text(text):
+            for c in chunk_text(text, size, overlap):
                 c = c.strip()
                 if not c:
                     continue
-                ids.append(str(uuid.uuid4()))
-                docs.append(c)
-                metas.append({"source": name, "page": page_num})
-                total += 1
+                yield c, {"source": name, "page": page_num, **base}, parts
+
+def build_index(db_dir: str = DB_DIR, collection: str = COLLECTION_NAME, size: int = CHUNK_SIZE,
+                overlap: int = CHUNK_OVERLAP, model_name: str = EMB_MODEL, emb_fn=None, src_dir: str = SRC_DIR,
+                partitions: bool = True) -> int:
+    import chromadb
+    os.makedirs(db_dir, exist_ok=True)
+    client = chromadb.PersistentClient(path=db_dir)
+    emb_fn = emb_fn or make_embedding_function(model_name, batching=False)
+    col = client.get_or_create_collection(name=collection, embedding_function=emb_fn)
+    part_cols = {}
+
+    def flush(docs, metas, ids, parts):
+        # embed once; partition collections reuse the same vectors
+        embs = emb_fn(docs)
+        col.add(documents=docs, metadatas=metas, ids=ids, embeddings=embs)
+        if not partitions:
+            return
+        by_part = {}
+        for i, keys in enumerate(parts):
+            for field, value in keys:
+                by_part.setdefault((field, value), []).append(i)
+        for (field, value), idxs in by_part.items():
+            name = partition_name(collection, field, value)
+            pc = part_cols.get(name)
+            if pc is None:
+                # the exact tag lets the retriever route only filters that would match it
+                pc = part_cols[name] = client.get_or_create_collection(
+                    name=name, embedding_function=emb_fn,
+                    metadata={"partition_field": field, "partition_value": str(value)})
+            pc.add(documents=[docs[i] for i in idxs], metadatas=[metas[i] for i in idxs],
+                   ids=[ids[i] for i in idxs], embeddings=[embs[i] for i in idxs])
 
-                # batch insert every 1k to keep memory steady
-                if len(ids) >= 1000:
-                    col.add(documents=docs, metadatas=metas, ids=ids)
-                    docs, metas, ids = [], [], []
+    total = 0
+    docs, ids, metas, parts = [], [], [], []
+
+    for c, meta, keys in iter_chunks(src_dir, size, overlap):
+        ids.append(str(uuid.uuid4()))
+        docs.append(c)
+        metas.append(meta)
+        parts.append(keys)
+        total += 1
+
+        # batch insert every 1k to keep memory steady
+        if len(ids) >= BATCH_SIZE:
+            flush(docs, metas, ids, parts)
+            docs, metas, ids, parts = [], [], [], []
 
     if ids:
-        col.add(documents=docs, metadatas=metas, ids=ids)
+        flush(docs, metas, ids, parts)
+    return total
+
+def validate_index(db_dir: str, collection: str, total: int, emb_fn=None):
+    # smoke retrieval against the freshly built index before it takes traffic
+    from retriever import Retriever
+    if total <= 0:
+        raise RuntimeError("no chunks ingested")
+    prev = index_versions.read_active()
+    if prev and prev.get("chunks") and total < MIN_CHUNK_RATIO * prev["chunks"]:
+        raise RuntimeError(f"new index has {total} chunks vs {prev['chunks']} in the active one")
+    retr = Retriever(embedding_function=emb_fn, db_dir=db_dir, collection=collection)
+    if retr.col.count() != total:
+        raise RuntimeError(f"collection has {retr.col.count()} chunks, expected {total}")
+    hits = retr.search(VALIDATION_QUERY, k=3)
+    if not hits or not all(h["text"] for h in hits):
+        raise RuntimeError("smoke retrieval returned no results")
+
+def main():
+    ap = argparse.ArgumentParser(description="Build a new index version and switch the live pointer to it.")
+    ap.add_argument("--in-place", action="store_true", help=f"add to {DB_DIR} directly (legacy, not zero-downtime)")
+    ap.add_argument("--no-gc", action="store_true", help="keep retired index versions")
+    args = ap.parse_args()
+
+    if args.in_place:
+        total = build_index()
+        print(f"Ingested {total} chunks into Chroma at {DB_DIR} (collection='{COLLECTION_NAME}').")
+        return
+
+    emb_fn = make_embedding_function(EMB_MODEL, batching=False)
+    version, db_dir = index_versions.new_version()
+    total = build_index(db_dir=db_dir, emb_fn=emb_fn)
+    try:
+        validate_index(db_dir, COLLECTION_NAME, total, emb_fn)
+    except Exception as e:
+        print(f"Validation failed for index version {version} at {db_dir}: {e}. Active index left unchanged.")
+        raise SystemExit(1)
+    index_versions.activate(version, db_dir, COLLECTION_NAME, chunks=total)
+    print(f"Ingested {total} chunks into {db_dir} (collection='{COLLECTION_NAME}') and activated version {version}.")
 
-    print(f"Ingested {total} chunks into Chroma at {DB_DIR} (collection='{COLLECTION_NAME}').")
+    if not args.no_gc:
+        for name in index_versions.gc():
+            print("removed retired index version:", name)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,141 @@
+import os
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Per-process metrics registry rendered in the Prometheus text format.
+# Under gunicorn every worker keeps its own registry, so /metrics reports the
+# worker that served the scrape; aggregate with sum() across instances.
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 10, 20, 50)
+
+HELP = {
+    "agroqa_stage_seconds": ("histogram", "Time spent in each /chat pipeline stage."),
+    "agroqa_request_seconds": ("histogram", "End-to-end /chat latency."),
+    "agroqa_retrieved_chunks": ("histogram", "Chunks returned by the retriever per request."),
+    "agroqa_tokens_total": ("counter", "LLM tokens used, by stage and kind."),
+    "agroqa_cache_requests_total": ("counter", "Cache lookups, by cache and result."),
+    "agroqa_errors_total": ("counter", "Exceptions raised inside a pipeline stage."),
+    "agroqa_shed_total": ("counter", "Requests rejected by admission control, by reason."),
+    "agroqa_degraded_total": ("counter", "Retrieval-only answers served because the LLM queue was saturated."),
+    "agroqa_http_requests_total": ("counter", "HTTP responses, by endpoint and status."),
+    "agroqa_chat_inflight": ("gauge", "Distinct /chat computations in flight (coalesced callers share one)."),
+    "agroqa_llm_slots": ("gauge", "LLM admission slots, by state (active, waiting, max_concurrency, max_queue)."),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_hists = {}
+_gauges = {}
+_timings = contextvars.ContextVar("agroqa_timings", default=None)
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + value
+
+def observe(name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+    if not ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        h = _hists.get(k)
+        if h is None:
+            h = _hists[k] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+        i = bisect_left(h["buckets"], value)
+        if i < len(h["counts"]):
+            h["counts"][i] += 1
+        h["sum"] += value
+        h["count"] += 1
+
+def set_gauge(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def begin_request() -> dict | None:
+    # the returned dict collects stage timings/tokens for the current request (None when disabled)
+    if not ENABLED:
+        return None
+    t = {"stages_ms": {}, "tokens": {"prompt": 0, "completion": 0}}
+    _timings.set(t)
+    return t
+
+@contextmanager
+def timed(stage: str):
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc("agroqa_errors_total", stage=stage)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        observe("agroqa_stage_seconds", dt, stage=stage)
+        t = _timings.get()
+        if t is not None:
+            t["stages_ms"][stage] = round(t["stages_ms"].get(stage, 0.0) + dt * 1000, 2)
+
+def add_tokens(stage: str, prompt: int | None, completion: int | None):
+    if not ENABLED:
+        return
+    t = _timings.get()
+    for kind, n in (("prompt", prompt), ("completion", completion)):
+        if not n:
+            continue
+        inc("agroqa_tokens_total", n, stage=stage, kind=kind)
+        if t is not None:
+            t["tokens"][kind] += n
+
+def record_cache(cache: str, hit: bool):
+    inc("agroqa_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+def _fmt_value(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+def render() -> str:
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        hists = {k: {**h, "counts": list(h["counts"])} for k, h in _hists.items()}
+
+    names = sorted({n for n, _ in counters} | {n for n, _ in gauges} | {n for n, _ in hists})
+    lines = []
+    for name in names:
+        kind, text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (n, labels), v in sorted({**counters, **gauges}.items()):
+            if n == name:
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+        for (n, labels), h in sorted(hists.items()):
+            if n != name:
+                continue
+            cum = 0
+            for le, c in zip(h["buckets"], h["counts"]):
+                cum += c
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', le)])} {cum}")
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {h['count']}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(h['sum'])}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h['count']}")
+    return "\n".join(lines) + "\n"
@@ -1,6 +1,43 @@
 import os
+import re
+import time
+from types import SimpleNamespace
 from typing import List, Dict
-from openai import OpenAI
+import metrics
+
+# "stub" swaps OpenAI for a canned offline responder (benchmarks, CI)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
+
+_client = None
+
+class _StubCompletions:
+    def create(self, model: str, messages: list, temperature: float = 0.2):
+        if LLM_STUB_LATENCY_MS:
+            time.sleep(LLM_STUB_LATENCY_MS / 1000)
+        prompt = "\n".join(m["content"] for m in messages)
+        if "ORIGINAL QUESTION:" in prompt:
+            q = prompt.split("ORIGINAL QUESTION:", 1)[1].split("\n", 1)[0]
+            if re.search(r"(?i)\b(chart|plot|graph|matplotlib)\b", q):
+                content = "plt.bar(['A', 'B', 'C'], [1.0, 2.5, 1.8])\nplt.title('Stub chart')"
+            else:
+                content = "N/A"
+        else:
+            n = max(1, len(re.findall(r"(?m)^\[\d+\] source=", prompt)))
+            content = " ".join(f"Stub answer sentence grounded in source [{i}]." for i in range(1, min(n, 3) + 1))
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+def _get_client():
+    # lazy import; the client is reused so its HTTP connection pool is too
+    global _client
+    if _client is None:
+        if LLM_BACKEND == "stub":
+            _client = SimpleNamespace(chat=SimpleNamespace(completions=_StubCompletions()))
+        else:
+            from openai import OpenAI
+            _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 SYSTEM = (
     "You are AgroQA, a farm management assistant. Use ONLY the provided context unless common sense is trivial. "
@@ -68,24 +105,33 @@ def build_graph_prompt(question: str, docs: List[Dict], answer: str) -> list:
         {"role": "user", "content": user_content},
     ]
 
+def _record_usage(stage: str, resp):
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        metrics.add_tokens(stage, getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+
 def answer(question: str, docs: List[Dict], mode: str = "short") -> str:
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = _get_client()
     model = os.getenv("MODEL_NAME", "gpt-4o-mini")
     
     messages = build_answer_prompt(question, docs, mode)
-    resp = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.2,
-    )
+    with metrics.timed("llm_answer"):
+        resp = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.2,
+        )
+    _record_usage("llm_answer", resp)
     answer = resp.choices[0].message.content
     
     graph = build_graph_prompt(question, docs, answer)
-    resp_graph = client.chat.completions.create(
-        model=model,
-        messages=graph,
-        temperature=0.2,
-    )
+    with metrics.timed("llm_graph"):
+        resp_graph = client.chat.completions.create(
+            model=model,
+            messages=graph,
+            temperature=0.2,
+        )
+    _record_usage("llm_graph", resp_graph)
     answer_graph = resp_graph.choices[0].message.content.strip()
     if answer_graph.startswith("```"):
         answer_graph = answer_graph.strip("`")
@@ -1,11 +1,22 @@
 import os
-import chromadb
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+import re
+import time
+import threading
+import index_versions
 
 DB_DIR = "indexes/chroma"
 COLLECTION_NAME = "agroqa"
 EMB_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 RAW_DIR = "data/raw"
+INDEX_POLL_SECONDS = float(os.getenv("INDEX_POLL_SECONDS", "5"))
+# seed tags that get their own partition collections at ingest time
+PARTITION_FIELDS = ("publisher", "topic")
+
+def tag_slug(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(value).lower()).strip("_")[:40] or "none"
+
+def partition_name(collection: str, field: str, value: str) -> str:
+    return f"{collection}__{field}_{tag_slug(value)}"
 
 def _expand_contains_clause(k, v):
     if isinstance(v, dict) and "$contains" in v and k == "source":
@@ -55,29 +66,161 @@ def _build_where(filters: dict | None):
         return clauses[0]
     return {"$and": clauses}
 
+def make_embedding_function(model_name: str = EMB_MODEL, **kwargs):
+    # backend (torch / onnx / onnx-int8), threads and batching come from EMB_* env vars unless given;
+    # the heavy runtime is only imported when the function is built
+    import embeddings
+    return embeddings.make_embedding_function(model_name, **kwargs)
+
 class Retriever:
-    def __init__(self, k: int = 5):
-        self.client = chromadb.PersistentClient(path=DB_DIR)
-        self.col = self.client.get_or_create_collection(
-            name=COLLECTION_NAME,
-            embedding_function=SentenceTransformerEmbeddingFunction(model_name=EMB_MODEL)
-        )
+    def __init__(self, k: int = 5, embedding_function=None, db_dir: str | None = None,
+                 collection: str | None = None):
+        # a preloaded embedding function can be shared (e.g. loaded in the gunicorn master before fork)
+        self.emb_fn = embedding_function or make_embedding_function()
         self.k = k
+        # without an explicit location, follow the blue/green pointer in index_versions
+        self.follow_active = db_dir is None and collection is None
+        self._swap_lock = threading.Lock()
+        self._next_poll = 0.0
+        self._pointer_mtime = None
+        self._live = (None, None, {}, None)
+        self._retired = []
+        if self.follow_active:
+            self._pointer_mtime = index_versions.active_mtime()
+            self._open_active()
+        else:
+            self._open(db_dir or DB_DIR, collection or COLLECTION_NAME, create=db_dir is None)
+
+    @property
+    def client(self):
+        return self._live[0]
+
+    @property
+    def col(self):
+        return self._live[1]
+
+    @property
+    def version(self):
+        return self._live[3]
+
+    def _open(self, db_dir: str, collection: str, version: str | None = None, create: bool = False):
+        import chromadb
+        # only the legacy DB_DIR may be created on demand; a missing version dir or
+        # collection must fail loudly instead of serving an empty index
+        if not create and not os.path.isdir(db_dir):
+            raise FileNotFoundError(f"index directory not found: {db_dir}")
+        client = chromadb.PersistentClient(path=db_dir)
+        if create:
+            col = client.get_or_create_collection(name=collection, embedding_function=self.emb_fn)
+        else:
+            col = client.get_collection(name=collection, embedding_function=self.emb_fn)
+        prefix = collection + "__"
+        parts = {}
+        for c in client.list_collections():
+            name = getattr(c, "name", c)
+            if name.startswith(prefix):
+                parts[name] = client.get_collection(name=name, embedding_function=self.emb_fn)
+        # one assignment swaps everything; in-flight queries keep the snapshot they already hold
+        self._live = (client, col, parts, version)
+
+    def _route(self, col, parts, filters):
+        # send simple publisher/topic equality filters to a partition collection,
+        # so the query searches a smaller index instead of filtering the whole one
+        if not isinstance(filters, dict) or "where" in filters or any(
+                isinstance(k, str) and k.startswith("$") for k in filters):
+            return col, filters
+        rest = dict(filters)
+        routed = None
+        for field in PARTITION_FIELDS:
+            value = rest.get(field)
+            if not isinstance(value, str):
+                continue
+            part = parts.get(partition_name(col.name, field, value))
+            if field == "publisher" and part is not None and \
+                    (part.metadata or {}).get("partition_value") != value:
+                # partitions are named by slug, but the unrouted filter is an exact match
+                part = None
+            if part is not None and routed is None:
+                routed = part
+                del rest[field]
+            elif field == "topic":
+                # topics are stored as typed boolean flags on every chunk
+                del rest[field]
+                rest[f"topic_{tag_slug(value)}"] = True
+        return routed or col, rest or None
+
+    def _open_active(self):
+        state = index_versions.read_active()
+        if state:
+            self._open(state["path"], state["collection"], state["version"])
+        else:
+            self._open(DB_DIR, COLLECTION_NAME, create=True)
+
+    def _release_retired(self):
+        # Chroma caches one system (and its HNSW segments) per path until the client
+        # is closed; close superseded clients one poll after the swap, so queries
+        # still holding the old snapshot have finished
+        while self._retired:
+            client = self._retired.pop()
+            try:
+                client.close()
+            except Exception as e:
+                print("closing retired index failed:", e)
+
+    def _maybe_swap(self):
+        if not self.follow_active:
+            return
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        with self._swap_lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + INDEX_POLL_SECONDS
+            self._release_retired()
+            mtime = index_versions.active_mtime()
+            if mtime == self._pointer_mtime:
+                return
+            self._pointer_mtime = mtime
+            state = index_versions.read_active()
+            if state and state.get("version") != self.version:
+                old = self.client
+                try:
+                    self._open(state["path"], state["collection"], state["version"])
+                    if old is not None:
+                        self._retired.append(old)
+                except Exception as e:
+                    # keep serving the current version rather than failing the request
+                    print("index swap failed:", state.get("version"), e)
+
+    def embed(self, texts):
+        return self.emb_fn(list(texts))
 
     def search(self, query: str, k: int | None = None, filters: dict | None = None):
+        return self.search_many([query], k=k, filters=filters)[0]
+
+    def search_many(self, queries, k: int | None = None, filters: dict | None = None, embeddings=None):
+        # one embedding batch and one Chroma query for many questions sharing the same filters
         k = k or self.k
+        if embeddings is None:
+            embeddings = self.embed(queries)
+        self._maybe_swap()
+        _, col, parts, _ = self._live
+        col, filters = self._route(col, parts, filters)
         where = _build_where(filters)
-        res = self.col.query(
-            query_texts=[query],
+        res = col.query(
+            query_embeddings=embeddings,
             n_results=k,
             where=where,
             include=["documents", "metadatas", "distances"],
         )
-        hits = []
-        docs = res.get("documents", [[]])[0]
-        metas = res.get("metadatas", [[]])[0]
-        dists = res.get("distances", [[]])[0]
-        for text, meta, dist in zip(docs, metas, dists):
-            score = 1.0 / (1.0 + float(dist)) if dist is not None else None
-            hits.append({"text": text, "meta": meta, "score": score})
-        return hits
\ No newline at end of file
+        out = []
+        for docs, metas, dists in zip(res.get("documents") or [], res.get("metadatas") or [], res.get("distances") or []):
+            hits = []
+            for text, meta, dist in zip(docs, metas, dists):
+                score = 1.0 / (1.0 + float(dist)) if dist is not None else None
+                hits.append({"text": text, "meta": meta, "score": score})
+            out.append(hits)
+        # keep one (possibly empty) hit list per query
+        out.extend([] for _ in range(len(embeddings) - len(out)))
+        return out
@@ -1,65 +1,81 @@
 import os
 import json
-import requests
+import argparse
 from pathlib import Path
 from datetime import datetime
+from eval.runner import make_asker, run_ordered, add_common_args
 
 API_URL = "http://localhost:8000/chat"
 JSONL_PATH = Path("eval/seed_qas.jsonl")
 OUT_PATH = Path("eval/smoke_results.txt")
 
+def load_cases(path: Path):
+    cases = []
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for ln, raw in enumerate(f, 1):
+            line = raw.strip()
+            if not line or line.startswith("#") or line.startswith("//"):
+                continue
+            try:
+                ex = json.loads(line)
+            except json.JSONDecodeError as e:
+                cases.append({"ln": ln, "parse_error": f"{e.msg} (col {e.colno})"})
+                continue
+            cases.append({"ln": ln, "q": ex.get("q", "").strip(), "filters": ex.get("filters")})
+    return cases
+
 def main():
+    ap = add_common_args(argparse.ArgumentParser(description="Smoke-test /chat with the seed questions."))
+    ap.set_defaults(api=API_URL)
+    args = ap.parse_args()
+
     OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
     if not JSONL_PATH.exists():
         print(f"File not found: {JSONL_PATH.resolve()}")
         return
 
+    cases = load_cases(JSONL_PATH)
+    ask = make_asker(args.inprocess, args.api)
+
+    def work(ex):
+        if "parse_error" in ex:
+            return None
+        # Keep the original behavior (force short), but include filters if provided
+        return ask(ex["q"], mode="short", filters=ex["filters"])
+
     total = ok = 0
 
-    with open(OUT_PATH, "w", encoding="utf-8") as out, open(JSONL_PATH, "r", encoding="utf-8-sig") as f:
+    with open(OUT_PATH, "w", encoding="utf-8") as out:
         out.write(f"AgroQA Smoke Evaluation\n")
         out.write(f"Run at: {datetime.now().isoformat(timespec='seconds')}\n")
-        out.write(f"API: {API_URL}\n")
+        out.write(f"API: {'in-process' if args.inprocess else args.api}\n")
         out.write(f"Seed file: {JSONL_PATH.resolve()}\n")
         out.write("=" * 80 + "\n")
 
-        for ln, raw in enumerate(f, 1):
-            line = raw.strip()
-            if not line or line.startswith("#") or line.startswith("//"):
-                continue
-
-            try:
-                ex = json.loads(line)
-            except json.JSONDecodeError as e:
-                out.write(f"\n[skip] line {ln}: {e.msg} (col {e.colno})\n")
+        for ex, res in run_ordered(cases, work, args.concurrency):
+            ln = ex["ln"]
+            if res is None:
+                out.write(f"\n[skip] line {ln}: {ex['parse_error']}\n")
                 continue
 
-            q = ex.get("q", "").strip()
-            # Keep the original behavior (force short), but include filters if provided
-            payload = {"q": q, "mode": "short"}
-            if ex.get("filters") is not None:
-                payload["filters"] = ex["filters"]
-
-            try:
-                r = requests.post(API_URL, json=payload, timeout=60)
-            except Exception as e:
-                out.write(f"\n[{ln}] Q: {q}\nError: request failed :: {e}\n")
-                total += 1
+            q = ex["q"]
+            js, status, err, latency = res
+            total += 1
+            if status == "request_error":
+                out.write(f"\n[{ln}] Q: {q}\nError: request failed :: {err}\n")
                 continue
 
             out.write(f"\n[{ln}] Q: {q}\n")
-            if r.ok:
-                js = r.json()
+            if status == "ok":
                 ans = js.get("answer", "")
                 cits = js.get("citations", [])
                 out.write("A: " + ans + "\n")
                 out.write("Citations: " + json.dumps(cits, ensure_ascii=False) + "\n")
+                out.write(f"Latency: {latency:.0f} ms\n")
                 ok += 1
             else:
-                out.write(f"Error: {r.status_code} {r.text}\n")
-
-            total += 1
+                out.write(f"Error: {status} {err}\n")
 
         out.write("\n" + "=" * 80 + "\n")
         out.write(f"Summary: OK {ok}/{total} ({(ok/total*100 if total else 0):.1f}%)\n")
@@ -68,4 +84,4 @@ def main():
     print(f"Summary: OK {ok}/{total} ({(ok/total*100 if total else 0):.1f}%)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,14 @@
+import gc
+import app as agroqa
+from retriever import make_embedding_function
+
+# Loaded once in the gunicorn master (preload_app=True). The model weights are
+# inherited by every worker and shared copy-on-write; the Chroma client is not
+# fork-safe, so each worker opens its own in post_fork (see gunicorn.conf.py).
+embedding_function = make_embedding_function()
+
+# move everything allocated so far out of the collector's generations so GC
+# passes in the workers do not touch (and un-share) these pages
+gc.freeze()
+
+app = agroqa.app